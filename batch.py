@@ -0,0 +1,165 @@
+"""
+Vectorized move generation over many positions at once
+
+A BoardBatch keeps K positions as a (K, 12) NumPy uint64 array of bitboards (PIECE_SYMBOL order)
+and evaluates attack sets and pseudo-legal move counts for all of them with a handful of array
+operations. The shift helpers of the chess module are reused as they are, sliding pieces are
+flooded set-wise along each direction instead of looked up square by square.
+
+NumPy is required for this module only.
+"""
+
+import numpy as np
+
+from chess import (Board, WHITE, BLACK, RANK_1, RANK_8, E_LINE, KSCR_W, KSCR_B, QSCR_W, SQCR_B,
+                   STEPS, SLIDES, DIRECTIONS, KNIGHT_MOVS,
+                   _king_moves, _knight_attacks, _pawn_attacks, _pawn_moves, _shift_right_up, _shift_left_up,
+                   _shift_right_down, _shift_left_down)
+
+PLANES = 12
+
+_BYTE_COUNTS = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+
+def popcount(bitboards):
+    """
+    Number of set bits of every element of a uint64 array.
+    """
+    bitboards = np.asarray(bitboards, dtype=np.uint64)
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(bitboards).astype(np.int64)
+    counts = _BYTE_COUNTS[bitboards.view(np.uint8)].reshape(bitboards.shape + (8,))
+    return counts.sum(axis=-1, dtype=np.int64)
+
+
+def _fill(sliders, empty, shift):
+    """
+    Attacks of every slider in one direction: flood through empty squares and include the first blocker.
+    Works on Python ints and uint64 arrays alike.
+    """
+    flood = gen = sliders
+    for _ in range(6):
+        gen = shift(gen) & empty
+        flood = flood | gen
+    return shift(flood)
+
+
+class BoardBatch(object):
+    """
+    K positions stored as arrays:
+    pieces (K, 12) uint64, active_player (K,) bool, castling (K, 4) bool in K, Q, k, q order
+    and ep_square (K,) int8 where -1 means no en passant square.
+    """
+
+    def __init__(self, pieces, active_player, castling=None, ep_square=None):
+        self.pieces = np.asarray(pieces, dtype=np.uint64).reshape(-1, PLANES)
+        n = len(self.pieces)
+        self.active_player = np.asarray(active_player, dtype=bool).reshape(n)
+        self.castling = (np.zeros((n, 4), dtype=bool) if castling is None
+                         else np.asarray(castling, dtype=bool).reshape(n, 4))
+        self.ep_square = (np.full(n, -1, dtype=np.int8) if ep_square is None
+                          else np.asarray(ep_square, dtype=np.int8).reshape(n))
+
+    def __len__(self):
+        return len(self.pieces)
+
+    @classmethod
+    def from_boards(cls, boards):
+        """
+        Gather a sequence of Boards (or FEN strings) into a batch.
+        """
+        boards = [Board(board) if isinstance(board, str) else board for board in boards]
+        return cls(np.array([board.pieces for board in boards], dtype=np.uint64).reshape(-1, PLANES),
+                   [board.active_player for board in boards],
+                   [(board.white_king_side_castle_right, board.white_queen_side_castle_right,
+                     board.black_king_side_castle_right, board.black_queen_side_castle_right) for board in boards],
+                   [-1 if board.ep_square is None else board.ep_square for board in boards])
+
+    @classmethod
+    def from_fens(cls, lines, epd=False):
+        """
+        Build a batch from a FEN or EPD file (any iterable of lines).
+        """
+        return cls.from_boards(Board.from_fens(lines, epd=epd))
+
+    def occupancy(self, color):
+        """
+        (K,) uint64 array of all pieces of the given color
+        """
+        base = 6 if color else 0
+        return np.bitwise_or.reduce(self.pieces[:, base:base + 6], axis=1)
+
+    def occupied(self):
+        return np.bitwise_or.reduce(self.pieces, axis=1)
+
+    def attacks(self, color):
+        """
+        Squares attacked by the given color in every position, defended squares included.
+        Same result as Board.attacked_fields for each position.
+        """
+        return self._attacks(self.pieces, color, ~self.occupied())
+
+    @staticmethod
+    def _attacks(pieces, color, empty):
+        base = 6 if color else 0
+        king, queens, knights, bishops, rooks, pawns = (pieces[:, base + i] for i in range(6))
+        attacks = _king_moves(king) | _knight_attacks(knights) | _pawn_attacks(pawns, color)
+        for shift in STEPS:
+            attacks |= _fill(rooks | queens, empty, shift)
+        for shift in SLIDES:
+            attacks |= _fill(bishops | queens, empty, shift)
+        return attacks
+
+    def pseudo_legal_move_counts(self):
+        """
+        Number of pseudo-legal moves for the side to move in every position.
+        Matches len(list(Board.gen_pseudo_legal_moves())): king steps onto attacked squares are
+        left out, castling is counted and every promotion counts four times.
+        """
+        counts = np.zeros(len(self), dtype=np.int64)
+        for color in (WHITE, BLACK):
+            rows = self.active_player == bool(color)
+            if rows.any():
+                counts[rows] = self._move_counts(self.pieces[rows], self.castling[rows], self.ep_square[rows], color)
+        return counts
+
+    @classmethod
+    def _move_counts(cls, pieces, castling, ep_square, color):
+        base = 6 if color else 0
+        king, queens, knights, bishops, rooks, pawns = (pieces[:, base + i] for i in range(6))
+        own = np.bitwise_or.reduce(pieces[:, base:base + 6], axis=1)
+        enemies = np.bitwise_or.reduce(pieces[:, 6 - base:12 - base], axis=1)
+        empty = ~(own | enemies)
+        not_own = ~own
+        danger = cls._attacks(pieces, not color, empty)
+
+        # every direction (and knight jump) maps a target square back to exactly one piece,
+        # so the pop count of each per-direction target set is the number of moves
+        counts = np.zeros(len(pieces), dtype=np.int64)
+        for shift in STEPS:
+            counts += popcount(_fill(rooks | queens, empty, shift) & not_own)
+        for shift in SLIDES:
+            counts += popcount(_fill(bishops | queens, empty, shift) & not_own)
+        for jump in KNIGHT_MOVS:
+            counts += popcount(jump(knights) & not_own)
+        for shift in DIRECTIONS:
+            counts += popcount(shift(king) & not_own & ~danger)
+
+        ep = np.where(ep_square >= 0, np.left_shift(np.uint64(1), np.maximum(ep_square, 0).astype(np.uint64)),
+                      np.uint64(0))
+        targets = enemies | ep
+        last_rank = RANK_8 if color else RANK_1
+        captures = (_shift_right_up, _shift_left_up) if color else (_shift_right_down, _shift_left_down)
+        for moves in [_pawn_moves(pawns, color, empty)] + [shift(pawns) & targets for shift in captures]:
+            counts += popcount(moves) + 3 * popcount(moves & last_rank)
+
+        # castling, the king has to stand on its original square and may not cross attacked squares
+        home = RANK_1 if color else RANK_8
+        free = empty & ~danger
+        king_home = (king & E_LINE & home & ~danger) != 0
+        king_side, queen_side = (KSCR_W, QSCR_W) if color else (KSCR_B, SQCR_B)
+        rights = castling[:, 0:2] if color else castling[:, 2:4]
+        counts += rights[:, 0] & king_home & ((free & king_side) == king_side)
+        counts += (rights[:, 1] & king_home & ((free & queen_side) == queen_side) &
+                   (((king << 3) & ~empty) == 0))
+        return counts
@@ -3,8 +3,14 @@ A chess game
 
 """
 
-from itertools import groupby
-import re
+from array import array
+from collections import namedtuple
+from functools import lru_cache
+from itertools import permutations
+import argparse
+import random
+import sys
+import time
 
 # CONSTANTS
 
@@ -22,6 +28,11 @@ C_LINE = D_LINE << 1
 B_LINE = C_LINE << 1
 A_LINE = B_LINE << 1
 
+NOT_A_LINE = UNIVERSE ^ A_LINE
+NOT_AB_LINE = UNIVERSE ^ A_LINE ^ B_LINE
+NOT_H_LINE = UNIVERSE ^ H_LINE
+NOT_GH_LINE = UNIVERSE ^ H_LINE ^ G_LINE
+
 RANK_1 = 0xff
 RANK_2 = RANK_1 << 8
 RANK_3 = RANK_2 << 8
@@ -32,7 +43,9 @@ RANK_7 = RANK_6 << 8
 RANK_8 = RANK_7 << 8
 
 PIECES = [KING, QUEEN, KNIGHT, BISHOP, ROOK, PAWN] = range(6)
-PROMOTION = ['N', 'n', 'B', 'b', 'Q', 'q', 'R', 'r']
+COLORS = [BLACK, WHITE] = range(2)
+PROMOTION_PIECES = {'': KING, 'q': QUEEN, 'n': KNIGHT, 'b': BISHOP, 'r': ROOK}
+PROMOTION_SYMBOLS = ['', 'q', 'n', 'b', 'r', '']  # indexed by piece type
 
 SYMBOLS = {
     "R": u"♖", "r": u"♜",
@@ -43,6 +56,12 @@ SYMBOLS = {
     "P": u"♙", "p": u"♟",
 }
 
+# piece symbols indexed by color and piece type
+PIECE_SYMBOLS = [['k', 'q', 'n', 'b', 'r', 'p'], ['K', 'Q', 'N', 'B', 'R', 'P']]
+# boards index their bitboards by color * 6 + piece type
+PIECE_SYMBOL = PIECE_SYMBOLS[BLACK] + PIECE_SYMBOLS[WHITE]
+PIECE_INDEX = dict((symbol, piece) for piece, symbol in enumerate(PIECE_SYMBOL))
+
 FIELDS = [
     A8, B8, C8, D8, E8, F8, G8, H8,
     A7, B7, C7, D7, E7, F7, G7, H7,
@@ -66,6 +85,7 @@ SQ_NUM = {
 }
 
 F_NAME = dict([(v, k) for k, v in SQ_NUM.items()])
+SQUARE_NAME = [F_NAME[sq] for sq in range(64)]
 
 SQUARE_MASK = [1 << sq for sq in range(64)]
 
@@ -83,12 +103,19 @@ BB_A1 = 0x80
 BB_H8 = 0x100000000000000
 BB_A8 = 0x8000000000000000
 
+LIGHT_SQUARES = 0xaa55aa55aa55aa55
+DARK_SQUARES = UNIVERSE ^ LIGHT_SQUARES
+CORNERS = BB_H1 | BB_A1 | BB_H8 | BB_A8
 
-# PRIVATE STATIC METHODS
+# transposition table bounds
+BOUNDS = [EXACT, LOWER_BOUND, UPPER_BOUND] = range(3)
+
+# ways a game ends, the last two have to be claimed by a player
+TERMINATIONS = [CHECKMATE, STALEMATE, INSUFFICIENT_MATERIAL, FIFTY_MOVES, THREEFOLD_REPETITION] = range(5)
+Outcome = namedtuple('Outcome', ['termination', 'winner', 'result'])  # winner is WHITE, BLACK or None
 
 
-def _mask(x):
-    return SQUARE_MASK[x]
+# PRIVATE STATIC METHODS
 
 
 def _lsb(b: B_BOARD):
@@ -123,14 +150,6 @@ def _set_bit(b: B_BOARD, index, x):
     return b
 
 
-def _put(b, v):
-    return b | v
-
-
-def _pop(b, v):
-    return b & ~v
-
-
 def _shift_down(b: B_BOARD):
     return b >> 8
 
@@ -147,59 +166,87 @@ def _shift_up_up(b: B_BOARD):
     return (b << 16) & UNIVERSE
 
 
+# the shift helpers only use non-negative masks, so they work unchanged
+# on Python ints and on NumPy uint64 arrays of bitboards
+
 def _shift_right(b: B_BOARD):
-    return ((b >> 1) & ~A_LINE) & UNIVERSE
+    return (b >> 1) & NOT_A_LINE
 
 
 def _shift_right_right(b: B_BOARD):
-    return ((b >> 2) & ~A_LINE & ~B_LINE) & UNIVERSE
+    return (b >> 2) & NOT_AB_LINE
 
 
 def _shift_left(b: B_BOARD):
-    return ((b << 1) & ~H_LINE) & UNIVERSE
+    return (b << 1) & NOT_H_LINE
 
 
 def _shift_left_left(b: B_BOARD):
-    return ((b << 2) & ~H_LINE & ~G_LINE) & UNIVERSE
+    return (b << 2) & NOT_GH_LINE
 
 
 def _shift_right_up(b: B_BOARD):
-    return (b & ~A_LINE) << 9 & UNIVERSE
+    return (b & NOT_A_LINE) << 9 & UNIVERSE
 
 
 def _shift_right_down(b: B_BOARD):
-    return (b & ~A_LINE) >> 7
+    return (b & NOT_A_LINE) >> 7
 
 
 def _shift_left_up(b: B_BOARD):
-    return (b & ~H_LINE) << 7 & UNIVERSE
+    return (b & NOT_H_LINE) << 7 & UNIVERSE
 
 
 def _shift_left_down(b: B_BOARD):
-    return (b & ~H_LINE) >> 9
+    return (b & NOT_H_LINE) >> 9
+
+
+def _subsets(mask):
+    """
+    Enumerate every subset of a bit mask (carry-rippler trick).
+    :param mask: bit mask
+    """
+    sub = 0
+    while True:
+        yield sub
+        sub = (sub - mask) & mask
+        if not sub:
+            return
 
 
-def _traverse_delta(square, delta, occupied, enemies):
+def _ray_mask(square, delta):
     """
-    Traverse a direction starting from current square.
-    This method stops if a pos is occupied and breaks if
-    an enemy is met.
+    Squares reached from square along delta on an empty board,
+    without the last one: a blocker on the edge never shortens a ray.
     :param square: starting square
     :param delta: direction as a shift_method
-    :param occupied: bit mask of all occupied places
-    :param enemies: bit mask of all enemies
-    :return:
     """
-    moves = 0
-    sq = square
-
-    while True:
+    mask = 0
+    sq = delta(SQUARE_MASK[square])
+    while sq and delta(sq):
+        mask |= sq
         sq = delta(sq)
-        if sq & occupied:
-            return moves
-        moves |= sq
-        if sq & enemies or sq == 0:
-            return moves
+    return mask
+
+
+def _slide(square, deltas, occupied):
+    """
+    Walk every direction starting from square until the first occupied
+    field, which is included regardless of its color.
+    Only used to fill the sliding attack tables.
+    :param square: starting square
+    :param deltas: directions as shift_methods
+    :param occupied: bit mask of all occupied places
+    """
+    attacks = 0
+    for delta in deltas:
+        sq = delta(SQUARE_MASK[square])
+        while sq:
+            attacks |= sq
+            if sq & occupied:
+                break
+            sq = delta(sq)
+    return attacks
 
 
 # MOVE GENERATION CONSTANTS
@@ -228,31 +275,13 @@ def _king_moves(king):
     return moves
 
 
-def _queen_moves(queen, occupied, enemies):
-    moves = 0
-    for mov in DIRECTIONS:
-        moves |= _traverse_delta(queen, mov, occupied, enemies)
-    return moves
-
-
-def _bishop_moves(bishop, occupied, enemies):
-    moves = 0
-    for slide in SLIDES:
-        moves |= _traverse_delta(bishop, slide, occupied, enemies)
-    return moves
-
-
-def _rook_moves(rook, occupied, enemies):
-    moves = 0
-    for step in STEPS:
-        moves |= _traverse_delta(rook, step, occupied, enemies)
-    return moves
-
-
-def _pawn_moves(pawn, player):
+def _pawn_moves(pawn, player, empty):
+    # a double step needs the single step square to be empty as well
     if player:
-        return _shift_up(pawn) | _shift_up_up(pawn & RANK_2)
-    return _shift_down(pawn) | _shift_down_down(pawn & RANK_7)
+        single = _shift_up(pawn) & empty
+        return single | (_shift_up(single & RANK_3) & empty)
+    single = _shift_down(pawn) & empty
+    return single | (_shift_down(single & RANK_6) & empty)
 
 
 def _pawn_attacks(pawn, player):
@@ -261,18 +290,275 @@ def _pawn_attacks(pawn, player):
     return _shift_right_down(pawn) | _shift_left_down(pawn)
 
 
-def _knight_move(knight, occupied, *args):
+def _knight_attacks(knight):
     moves = 0
     for move in KNIGHT_MOVS:
         moves |= move(knight)
-    return moves & ~occupied
+    return moves
 
 
-def _knight_attacks(knight, *args):
-    moves = 0
-    for move in KNIGHT_MOVS:
-        moves |= move(knight)
-    return moves
+# PRECOMPUTED ATTACK TABLES
+# leaper attacks only depend on the square, so they are built once
+# from the shift helpers above and looked up by square index
+
+KING_ATTACKS = [_king_moves(SQUARE_MASK[sq]) for sq in range(64)]
+KNIGHT_ATTACKS = [_knight_attacks(SQUARE_MASK[sq]) for sq in range(64)]
+PAWN_ATTACKS = [[_pawn_attacks(SQUARE_MASK[sq], player) for sq in range(64)] for player in (0, 1)]
+
+
+def _line_tables(deltas):
+    """
+    Build per square the relevant occupancy mask of one line (rank, file or diagonal)
+    and a dict mapping every masked occupancy to the attacks along that line.
+    """
+    tables = []
+    for sq in range(64):
+        mask = 0
+        for delta in deltas:
+            mask |= _ray_mask(sq, delta)
+        tables.append((mask, {sub: _slide(sq, deltas, sub) for sub in _subsets(mask)}))
+    return tables
+
+
+def _slider_tables(lines):
+    """
+    Combine two line tables into one dict per square, so that the attack set of
+    a rook or bishop is a single lookup keyed by the relevant occupancy.
+    """
+    masks, attacks = [], []
+    for (mask_a, table_a), (mask_b, table_b) in zip(*lines):
+        masks.append(mask_a | mask_b)
+        attacks.append({sub: table_a[sub & mask_a] | table_b[sub & mask_b] for sub in _subsets(mask_a | mask_b)})
+    return masks, attacks
+
+
+# sliding attacks are looked up by square and occupancy, blockers of both colors
+# stop a ray and are part of the attack set, callers mask out their own pieces
+ROOK_MASKS, ROOK_ATTACKS = _slider_tables([_line_tables(STEPS[:2]), _line_tables(STEPS[2:])])
+BISHOP_MASKS, BISHOP_ATTACKS = _slider_tables([_line_tables(SLIDES[::2]), _line_tables(SLIDES[1::2])])
+
+
+def _rook_attacks(square, occupied):
+    return ROOK_ATTACKS[square][occupied & ROOK_MASKS[square]]
+
+
+def _bishop_attacks(square, occupied):
+    return BISHOP_ATTACKS[square][occupied & BISHOP_MASKS[square]]
+
+
+def _queen_attacks(square, occupied):
+    return (ROOK_ATTACKS[square][occupied & ROOK_MASKS[square]] |
+            BISHOP_ATTACKS[square][occupied & BISHOP_MASKS[square]])
+
+
+def _line_and_between_tables():
+    """
+    For every pair of squares on a common rank, file or diagonal build the full line
+    through both of them and the squares strictly between them, 0 otherwise.
+    """
+    line = [[0] * 64 for _ in range(64)]
+    between = [[0] * 64 for _ in range(64)]
+    for a in range(64):
+        for forward, backward in (STEPS[:2], STEPS[2:], SLIDES[::2], SLIDES[1::2]):
+            full = SQUARE_MASK[a] | _slide(a, (forward, backward), 0)
+            for delta in (forward, backward):
+                passed = 0
+                sq = delta(SQUARE_MASK[a])
+                while sq:
+                    b = _lsb(sq)
+                    line[a][b] = full
+                    between[a][b] = passed
+                    passed |= sq
+                    sq = delta(sq)
+    return line, between
+
+
+LINE, BETWEEN = _line_and_between_tables()
+
+
+# ZOBRIST HASHING
+# one random 64 bit key per piece and square, for black to move, for each of the four
+# castling rights and for each file of an ep square, a position hashes to the XOR of its keys
+
+_zobrist_random = random.Random(0x5EED)
+ZOBRIST_PIECES = [[_zobrist_random.getrandbits(64) for _ in range(64)] for _ in PIECE_SYMBOL]
+ZOBRIST_TURN = _zobrist_random.getrandbits(64)
+ZOBRIST_CASTLING = [_zobrist_random.getrandbits(64) for _ in range(4)]  # K, Q, k, q
+ZOBRIST_EP = [_zobrist_random.getrandbits(64) for _ in range(8)]
+
+
+# EVALUATION
+# material and piece-square values for the middle game and the end game, blended by the game
+# phase (the remaining minor and major pieces). Tables are seen from white, rank 8 first and
+# file A to H, just like a FEN. Board keeps the white minus black sums up to date in push and pop.
+
+MATERIAL_MG = [0, 1025, 337, 365, 477, 82]  # indexed by piece type
+MATERIAL_EG = [0, 936, 281, 297, 512, 94]
+PHASE_WEIGHTS = [0, 4, 1, 1, 2, 0]
+SEE_VALUES = [20000, 900, 320, 330, 500, 100]  # for exchanges, a king is never given up
+MAX_PHASE = 24
+
+PST_PAWN_MG = [
+    0, 0, 0, 0, 0, 0, 0, 0,
+    50, 50, 50, 50, 50, 50, 50, 50,
+    10, 10, 20, 30, 30, 20, 10, 10,
+    5, 5, 10, 25, 25, 10, 5, 5,
+    0, 0, 0, 20, 20, 0, 0, 0,
+    5, -5, -10, 0, 0, -10, -5, 5,
+    5, 10, 10, -20, -20, 10, 10, 5,
+    0, 0, 0, 0, 0, 0, 0, 0]
+PST_PAWN_EG = [
+    0, 0, 0, 0, 0, 0, 0, 0,
+    80, 80, 80, 80, 80, 80, 80, 80,
+    50, 50, 50, 50, 50, 50, 50, 50,
+    30, 30, 30, 30, 30, 30, 30, 30,
+    15, 15, 15, 15, 15, 15, 15, 15,
+    5, 5, 5, 5, 5, 5, 5, 5,
+    0, 0, 0, 0, 0, 0, 0, 0,
+    0, 0, 0, 0, 0, 0, 0, 0]
+PST_KNIGHT = [
+    -50, -40, -30, -30, -30, -30, -40, -50,
+    -40, -20, 0, 0, 0, 0, -20, -40,
+    -30, 0, 10, 15, 15, 10, 0, -30,
+    -30, 5, 15, 20, 20, 15, 5, -30,
+    -30, 0, 15, 20, 20, 15, 0, -30,
+    -30, 5, 10, 15, 15, 10, 5, -30,
+    -40, -20, 0, 5, 5, 0, -20, -40,
+    -50, -40, -30, -30, -30, -30, -40, -50]
+PST_BISHOP = [
+    -20, -10, -10, -10, -10, -10, -10, -20,
+    -10, 0, 0, 0, 0, 0, 0, -10,
+    -10, 0, 5, 10, 10, 5, 0, -10,
+    -10, 5, 5, 10, 10, 5, 5, -10,
+    -10, 0, 10, 10, 10, 10, 0, -10,
+    -10, 10, 10, 10, 10, 10, 10, -10,
+    -10, 5, 0, 0, 0, 0, 5, -10,
+    -20, -10, -10, -10, -10, -10, -10, -20]
+PST_ROOK = [
+    0, 0, 0, 0, 0, 0, 0, 0,
+    5, 10, 10, 10, 10, 10, 10, 5,
+    -5, 0, 0, 0, 0, 0, 0, -5,
+    -5, 0, 0, 0, 0, 0, 0, -5,
+    -5, 0, 0, 0, 0, 0, 0, -5,
+    -5, 0, 0, 0, 0, 0, 0, -5,
+    -5, 0, 0, 0, 0, 0, 0, -5,
+    0, 0, 0, 5, 5, 0, 0, 0]
+PST_QUEEN = [
+    -20, -10, -10, -5, -5, -10, -10, -20,
+    -10, 0, 0, 0, 0, 0, 0, -10,
+    -10, 0, 5, 5, 5, 5, 0, -10,
+    -5, 0, 5, 5, 5, 5, 0, -5,
+    0, 0, 5, 5, 5, 5, 0, -5,
+    -10, 5, 5, 5, 5, 5, 0, -10,
+    -10, 0, 5, 0, 0, 0, 0, -10,
+    -20, -10, -10, -5, -5, -10, -10, -20]
+PST_KING_MG = [
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -20, -30, -30, -40, -40, -30, -30, -20,
+    -10, -20, -20, -20, -20, -20, -20, -10,
+    20, 20, 0, 0, 0, 0, 20, 20,
+    20, 30, 10, 0, 0, 10, 30, 20]
+PST_KING_EG = [
+    -50, -40, -30, -20, -20, -30, -40, -50,
+    -30, -20, -10, 0, 0, -10, -20, -30,
+    -30, -10, 20, 30, 30, 20, -10, -30,
+    -30, -10, 30, 40, 40, 30, -10, -30,
+    -30, -10, 30, 40, 40, 30, -10, -30,
+    -30, -10, 20, 30, 30, 20, -10, -30,
+    -30, -30, 0, 0, 0, 0, -30, -30,
+    -50, -30, -30, -30, -30, -30, -30, -50]
+
+PST_MG = [PST_KING_MG, PST_QUEEN, PST_KNIGHT, PST_BISHOP, PST_ROOK, PST_PAWN_MG]  # indexed by piece type
+PST_EG = [PST_KING_EG, PST_QUEEN, PST_KNIGHT, PST_BISHOP, PST_ROOK, PST_PAWN_EG]
+
+
+def _eval_table(material, pst):
+    # signed value of every piece index on every square, table index 63 - sq is the square
+    # of a white piece and sq ^ 7 its mirror for a black piece
+    return ([[-(material[piece] + pst[piece][sq ^ 7]) for sq in range(64)] for piece in PIECES] +
+            [[material[piece] + pst[piece][63 - sq] for sq in range(64)] for piece in PIECES])
+
+
+EVAL_MG = _eval_table(MATERIAL_MG, PST_MG)  # indexed by piece index and square
+EVAL_EG = _eval_table(MATERIAL_EG, PST_EG)
+EVAL_PHASE = PHASE_WEIGHTS + PHASE_WEIGHTS  # indexed by piece index
+
+
+# FEN CODEC
+# every field of a FEN is translated with a lookup table, piece placement is
+# parsed and written rank by rank and ranks are cached, most of them repeat
+
+FEN_SIDES = {'w': True, 'b': False}
+# castling field -> (K, Q, k, q) for every valid field, and back
+FEN_CASTLING = dict((''.join(p), tuple(c in p for c in 'KQkq'))
+                    for n in range(1, 5) for p in permutations('KQkq', n))
+FEN_CASTLING['-'] = (False, False, False, False)
+FEN_CASTLING_FIELD = dict((flags, ''.join(c for c, f in zip('KQkq', flags) if f) or '-')
+                          for flags in FEN_CASTLING.values())
+# ep field -> square by side to move, white can only capture on rank 6 and black on rank 3
+FEN_EP_SQUARES = dict((side, dict([(name, sq) for name, sq in SQ_NUM.items() if name[1] == rank] + [('-', None)]))
+                      for side, rank in (('w', '6'), ('b', '3')))
+# (K, Q, k, q) -> king square, king index, rook square and rook index a castling right needs
+FEN_CASTLING_PIECES = [(E1, WHITE * 6 + KING, H1, WHITE * 6 + ROOK), (E1, WHITE * 6 + KING, A1, WHITE * 6 + ROOK),
+                       (E8, BLACK * 6 + KING, H8, BLACK * 6 + ROOK), (E8, BLACK * 6 + KING, A8, BLACK * 6 + ROOK)]
+
+
+@lru_cache(maxsize=1 << 16)
+def _parse_fen_rank(text):
+    """
+    returns (file offset from the A-file, piece index) for every piece of one rank of a FEN
+    """
+    pieces = []
+    offset = 0
+    for symbol in text:
+        if symbol in PIECE_INDEX:
+            pieces.append((offset, PIECE_INDEX[symbol]))
+            offset += 1
+        elif '1' <= symbol <= '8':
+            offset += ord(symbol) - 48
+        else:
+            raise ValueError("Invalid FEN string supplied: unknown piece symbol {!r}".format(symbol))
+    if offset != 8:
+        raise ValueError("Invalid FEN string supplied: rank {!r} does not cover 8 squares".format(text))
+    return tuple(pieces)
+
+
+@lru_cache(maxsize=1 << 16)
+def _fen_rank(row):
+    """
+    returns the FEN of one rank given its mailbox entries from the H-file to the A-file
+    """
+    text = ''
+    empty = 0
+    for piece in reversed(row):
+        if piece is None:
+            empty += 1
+        else:
+            if empty:
+                text += str(empty)
+                empty = 0
+            text += PIECE_SYMBOL[piece]
+    if empty:
+        text += str(empty)
+    return text
+
+
+def _parse_clock(text):
+    if not text.isdigit():
+        raise ValueError("Invalid FEN string supplied: bad clock {!r}".format(text))
+    return int(text)
+
+
+# STANDARD ALGEBRAIC NOTATION
+
+SAN_PIECES = {'K': KING, 'Q': QUEEN, 'N': KNIGHT, 'B': BISHOP, 'R': ROOK}
+SAN_SYMBOLS = ['K', 'Q', 'N', 'B', 'R', '']  # indexed by piece type
+SAN_CASTLING = {'O-O': -2, '0-0': -2, 'O-O-O': 2, '0-0-0': 2}  # king step in squares
+SAN_FILES = dict(zip('abcdefgh', [A_LINE, B_LINE, C_LINE, D_LINE, E_LINE, F_LINE, G_LINE, H_LINE]))
+SAN_RANKS = dict(zip('12345678', [RANK_1, RANK_2, RANK_3, RANK_4, RANK_5, RANK_6, RANK_7, RANK_8]))
 
 
 def b_board_to_str(b: B_BOARD) -> str:
@@ -287,38 +573,21 @@ class Board:
     """
     A Board class representing a chess game.
     There are 12 Bitboards: 6 for each player and 1 for each piece-type.
-    The Bitboards stored inside a dict and are accessed by their
-    corresponding piece-symbol.
+    The Bitboards are stored inside a list and are accessed by their
+    piece index (color * 6 + piece type, see PIECE_SYMBOL).
+    A 64 entry mailbox holds the piece index on every square (None if empty).
     """
 
+    __slots__ = ('pieces', 'squares', 'occupancy', 'occupied',
+                 'active_player', 'black_king_side_castle_right', 'black_queen_side_castle_right',
+                 'white_king_side_castle_right', 'white_queen_side_castle_right', 'ep_square',
+                 'half_move_clock', 'move_number', 'move_stack', 'zobrist',
+                 'mg_score', 'eg_score', 'phase', 'attack_cache')
+
     def __init__(self, fen=None):
         """
         Create a new game
         """
-        self.PIECES = {
-            'p': 0,
-            'b': 0,
-            'n': 0,
-            'k': 0,
-            'q': 0,
-            'r': 0,
-            'P': 0,
-            'B': 0,
-            'N': 0,
-            'K': 0,
-            'Q': 0,
-            'R': 0
-        }
-
-        # STATE
-        self.active_player = 1
-        self.black_king_side_castle_right = True
-        self.black_queen_side_castle_right = True
-        self.white_king_side_castle_right = True
-        self.white_queen_side_castle_right = True
-        self.ep_move = None
-        self.half_move_clock = 0
-        self.move_number = 0
         fen = BASEBOARD if fen is None else fen
         self.from_fen(fen)  # load game
 
@@ -328,6 +597,24 @@ class Board:
         """
         return self.to_fen()
 
+    def __hash__(self):
+        """
+        returns the incrementally updated zobrist key of the position
+        """
+        return self.zobrist
+
+    def __eq__(self, other):
+        """
+        two boards are equal if they hold the same position, clocks and ep squares no pawn can use are ignored
+        """
+        if not isinstance(other, Board):
+            return NotImplemented
+        return (self.zobrist == other.zobrist and
+                self.pieces == other.pieces and
+                self.active_player == other.active_player and
+                self._castling_key() == other._castling_key() and
+                self._ep_key(self.active_player) == other._ep_key(other.active_player))
+
     def __str__(self):
         """
         returns a nicely formatted board representation, including unicode
@@ -336,10 +623,7 @@ class Board:
         def name_bar() -> str:
             return '{offset}{row}{offset}\n'.format(offset=2 * ' ', row=' '.join(SQUARE_NAMES))
 
-        s = 64 * ['.']
-        for symbol, p in self.PIECES.items():
-            for k in _scan_lsb_first(p):
-                s[63 - k] = SYMBOLS[symbol]
+        s = ['.' if p is None else SYMBOLS[PIECE_SYMBOL[p]] for p in reversed(self.squares)]
 
         t = name_bar()
         for i in range(8):
@@ -347,131 +631,220 @@ class Board:
         t += name_bar()
         return t
 
+    def copy(self):
+        """
+        returns an independent copy of the board, including its move stack
+        """
+        board = Board.__new__(Board)
+        board.pieces = self.pieces[:]
+        board.squares = self.squares[:]
+        board.occupancy = self.occupancy[:]
+        board.occupied = self.occupied
+        board.active_player = self.active_player
+        board.black_king_side_castle_right = self.black_king_side_castle_right
+        board.black_queen_side_castle_right = self.black_queen_side_castle_right
+        board.white_king_side_castle_right = self.white_king_side_castle_right
+        board.white_queen_side_castle_right = self.white_queen_side_castle_right
+        board.ep_square = self.ep_square
+        board.half_move_clock = self.half_move_clock
+        board.move_number = self.move_number
+        board.move_stack = self.move_stack[:]
+        board.zobrist = self.zobrist
+        board.mg_score, board.eg_score, board.phase = self.mg_score, self.eg_score, self.phase
+        board.attack_cache = None
+        return board
+
+    __copy__ = copy
+
+    @property
+    def PIECES(self):
+        """
+        the bitboards keyed by piece symbol, built on demand
+        """
+        return dict(zip(PIECE_SYMBOL, self.pieces))
+
+    @property
+    def ep_move(self):
+        """
+        name of the ep square or None
+        """
+        return None if self.ep_square is None else SQUARE_NAME[self.ep_square]
+
+    @ep_move.setter
+    def ep_move(self, name):
+        self.ep_square = None if name is None else SQ_NUM[name]
+
     def reset(self):
         """
         initialize default values
         """
-        self.PIECES = {
-            'k': 0,
-            'q': 0,
-            'n': 0,
-            'b': 0,
-            'r': 0,
-            'p': 0,
-            'K': 0,
-            'Q': 0,
-            'N': 0,
-            'B': 0,
-            'R': 0,
-            'P': 0
-        }
+        self.pieces = [0] * 12
+        self.squares = [None] * 64
         # STATE
         self.active_player = 1
         self.black_king_side_castle_right = True
         self.black_queen_side_castle_right = True
         self.white_king_side_castle_right = True
         self.white_queen_side_castle_right = True
-        self.ep_move = None
+        self.ep_square = None
         self.half_move_clock = 0
         self.move_number = 0
+        # OCCUPANCY
+        self.occupancy = [0, 0]  # indexed by color
+        self.occupied = 0
+        # UNDO INFORMATION
+        self.move_stack = []
+        self.zobrist = 0
+        # EVALUATION
+        self.mg_score = self.eg_score = self.phase = 0
+        # ATTACK MAPS of the current position, filled on demand
+        self.attack_cache = None
 
     def from_fen(self, text):
-        # reset all values
-        self.reset()
-
-        sq = 1 << 63
+        """
+        load a position from a FEN, raises ValueError for malformed input
+        """
+        fields = text.split()
+        if len(fields) != 6:
+            raise ValueError("Invalid FEN string supplied")
+        self._load_fields(*fields)
 
-        text = text.split(' ')
-        if len(text) != 6:
+    def _load_fields(self, placement, side, castling, ep, half_move_clock, move_number):
+        # validate everything first, so a bad FEN leaves the board untouched
+        if side not in FEN_SIDES or castling not in FEN_CASTLING or ep not in FEN_EP_SQUARES.get(side, ()):
             raise ValueError("Invalid FEN string supplied")
+        ranks = placement.split('/')
+        if len(ranks) != 8:
+            raise ValueError("Invalid FEN string supplied: expected 8 ranks")
+        ranks = [_parse_fen_rank(rank) for rank in ranks]
+        half_move_clock, move_number = _parse_clock(half_move_clock), _parse_clock(move_number)
+        placed = [None] * 64
+        for base, rank in zip(range(63, -1, -8), ranks):
+            for offset, piece in rank:
+                placed[base - offset] = piece
+
+        ep_square = FEN_EP_SQUARES[side][ep]
+        if ep_square is not None:
+            # the pawn that moved two squares stands in front of the ep square, the squares it crossed are empty
+            step = -8 if side == 'w' else 8
+            if (placed[ep_square + step] != (BLACK if side == 'w' else WHITE) * 6 + PAWN or
+                    placed[ep_square] is not None or placed[ep_square - step] is not None):
+                raise ValueError("Invalid FEN string supplied: no pawn can be captured en passant on " + ep)
+        # castling rights without the king or the rook on its square are dropped
+        rights = tuple(right and placed[king_sq] == king and placed[rook_sq] == rook
+                       for right, (king_sq, king, rook_sq, rook) in zip(FEN_CASTLING[castling], FEN_CASTLING_PIECES))
 
-        pieces = text[0]
-        for symbol in pieces:
-            if symbol.isdigit():
-                sq = sq >> int(symbol)
-            elif symbol in self.PIECES:
-                self.PIECES[symbol] |= sq
-                sq = sq >> 1
-        self.active_player = True if text[1] == 'w' else False
-        self.black_king_side_castle_right = 'k' in text[2]
-        self.black_queen_side_castle_right = 'q' in text[2]
-        self.white_king_side_castle_right = 'K' in text[2]
-        self.white_queen_side_castle_right = 'Q' in text[2]
-        self.ep_move = text[3] if text[3] != "-" else None
-        self.half_move_clock = int(text[4])
-        self.move_number = int(text[5])
+        # reset all values
+        self.reset()
+        pieces, squares = self.pieces, self.squares
+        key = mg = eg = phase = 0
+        for sq, piece in enumerate(placed):
+            if piece is not None:
+                pieces[piece] |= SQUARE_MASK[sq]
+                squares[sq] = piece
+                key ^= ZOBRIST_PIECES[piece][sq]
+                mg += EVAL_MG[piece][sq]
+                eg += EVAL_EG[piece][sq]
+                phase += EVAL_PHASE[piece]
+        self.mg_score, self.eg_score, self.phase = mg, eg, phase
+
+        self.active_player = FEN_SIDES[side]
+        (self.white_king_side_castle_right, self.white_queen_side_castle_right,
+         self.black_king_side_castle_right, self.black_queen_side_castle_right) = rights
+        self.ep_square = ep_square
+        self.half_move_clock = half_move_clock
+        self.move_number = move_number
+
+        self.occupancy = [pieces[0] | pieces[1] | pieces[2] | pieces[3] | pieces[4] | pieces[5],
+                          pieces[6] | pieces[7] | pieces[8] | pieces[9] | pieces[10] | pieces[11]]
+        self.occupied = self.occupancy[BLACK] | self.occupancy[WHITE]
+
+        if not self.active_player:
+            key ^= ZOBRIST_TURN
+        self.zobrist = key ^ self._castling_key() ^ self._ep_key(self.active_player)
 
     def to_fen(self) -> str:
-        s = 64 * ['.']
+        squares = self.squares
+        return '{} {} {} {} {} {}'.format(
+            '/'.join([_fen_rank(tuple(squares[base:base + 8])) for base in range(56, -1, -8)]),
+            'w' if self.active_player else 'b',
+            FEN_CASTLING_FIELD[(self.white_king_side_castle_right, self.white_queen_side_castle_right,
+                                self.black_king_side_castle_right, self.black_queen_side_castle_right)],
+            '-' if self.ep_square is None else SQUARE_NAME[self.ep_square],
+            self.half_move_clock,
+            self.move_number)
+
+    @classmethod
+    def from_fens(cls, lines, epd=False):
+        """
+        Lazily load one board per line from any iterable of FENs, e.g. an open file.
+        Empty lines and lines starting with '#' are skipped.
+        :param lines: iterable of FEN strings
+        :param epd: lines are EPD records, only the first four fields are used and the
+                    clocks are set to 0 1
+        """
+        for line in lines:
+            fields = line.split()
+            if not fields or fields[0][0] == '#':
+                continue
+            board = cls.__new__(cls)
+            if epd:
+                if len(fields) < 4:
+                    raise ValueError("Invalid EPD string supplied")
+                board._load_fields(fields[0], fields[1], fields[2], fields[3], '0', '1')
+            elif len(fields) != 6:
+                raise ValueError("Invalid FEN string supplied")
+            else:
+                board._load_fields(*fields)
+            yield board
 
-        # place all piece symbols
-        for symbol, p in self.PIECES.items():
-            for k in _scan_lsb_first(p):
-                s[63 - k] = symbol
-
-        # insert /
-        for i in range(7):
-            s.insert(8 + i * 8 + i, '/')
-
-        # replace .
-        s = [str(len(list(s))) if _ else ''.join(list(s)) for _, s in groupby(s, key=lambda x: x == '.')]
-
-        # append additional state information
-        s.append(' w ' if self.active_player else ' b ')
-        s.append('K' if self.white_king_side_castle_right else '')
-        s.append('Q' if self.white_queen_side_castle_right else '')
-        s.append('k' if self.black_king_side_castle_right else '')
-        s.append('q' if self.black_queen_side_castle_right else '')
-        s.append('-' if not any((self.black_queen_side_castle_right,
-                                 self.black_king_side_castle_right,
-                                 self.white_queen_side_castle_right,
-                                 self.white_king_side_castle_right
-                                 )) else '')
-        s.append(' {} '.format(self.ep_move if self.ep_move else '-'))
-        s.append('{} '.format(self.half_move_clock))
-        s.append('{}'.format(self.move_number))
-
-        return ''.join(s)
+    @staticmethod
+    def to_fens(boards):
+        """
+        Lazily serialize every board of an iterable, one FEN per board.
+        """
+        for board in boards:
+            yield board.to_fen()
 
     def _all_white_pieces(self) -> int:
-        pieces = 0
-        for symbol, val in self.PIECES.items():
-            if symbol.isupper():
-                pieces |= val
-        return pieces
+        return self.occupancy[WHITE]
 
     def _all_black_pieces(self) -> int:
-        pieces = 0
-        for symbol, val in self.PIECES.items():
-            if symbol.islower():
-                pieces |= val
-        return pieces
+        return self.occupancy[BLACK]
 
     def _all_pieces(self) -> int:
-        return self._all_black_pieces() | self._all_white_pieces()
-
-    def _filter_pieces_by_side(self, player):
-        return [v for k, v in self.PIECES.items() if (k.isupper() if player else k.islower())]
+        return self.occupied
 
-    def attacked_fields(self, by_player, enemies=None) -> int:
+    def attacked_fields(self, by_player, occupied=None) -> int:
         """
-        this methods returns every field that is currently under attack by the specified player
+        this methods returns every field that is currently under attack by the specified player,
+        fields occupied by the players own pieces are included (they are defended)
         :param by_player: change player
-        :param enemies: provide different enemies
+        :param occupied: provide a different occupancy of both sides for sliding pieces
         :return:
         """
+        if occupied is None:
+            cache = self.attack_cache
+            if cache is None:
+                cache = self.attack_cache = {}
+            attacks = cache.get(by_player)
+            if attacks is None:
+                attacks = cache[by_player] = self.attacked_fields(by_player, self.occupied)
+            return attacks
+
         attacked_fields = 0
-        occupied = self._all_white_pieces() if by_player else self._all_black_pieces()
-        if enemies is None:
-            enemies = self._all_black_pieces() if by_player else self._all_white_pieces()
-        king, queens, knights, bishops, rooks, pawns = self._filter_pieces_by_side(by_player)
+        king, queens, knights, bishops, rooks, pawns = self.pieces[6:] if by_player else self.pieces[:6]
 
-        attacked_fields |= _king_moves(king)
+        for i in _scan_lsb_first(king):
+            attacked_fields |= KING_ATTACKS[i]
+        for i in _scan_lsb_first(knights):
+            attacked_fields |= KNIGHT_ATTACKS[i]
+        # all pawns are shifted at once, cheaper than one lookup per pawn
         attacked_fields |= _pawn_attacks(pawns, by_player)
 
-        for p, m in zip((queens, bishops, rooks, knights), (_queen_moves, _bishop_moves, _rook_moves, _knight_attacks)):
+        for p, m in zip((queens, bishops, rooks), (_queen_attacks, _bishop_attacks, _rook_attacks)):
             for i in _scan_lsb_first(p):
-                attacked_fields |= m(SQUARE_MASK[i], occupied, enemies)
+                attacked_fields |= m(i, occupied)
 
         return attacked_fields
 
@@ -479,228 +852,981 @@ class Board:
         if player is None:
             player = self.active_player
 
-        occupied = self._all_white_pieces() if player else self._all_black_pieces()
-        enemies = self._all_black_pieces() if player else self._all_white_pieces()
-        king, queens, knights, bishops, rooks, pawns = [v for k, v in self.PIECES.items() if
-                                                        (k.isupper() if player else k.islower())]
+        occupied = self.occupancy[player]
+        enemies = self.occupancy[not player]
+        all_pieces = self.occupied
+        king, queens, knights, bishops, rooks, pawns = self.pieces[6:] if player else self.pieces[:6]
+        attacked = self.attacked_fields(not player) if king else 0
 
-        # iterate piece by piece over queens, bishops, rooks and knights:
-        for p, move in zip((queens, bishops, rooks, knights), (_queen_moves, _bishop_moves, _rook_moves, _knight_move)):
+        # iterate piece by piece over queens, bishops and rooks:
+        for p, move in zip((queens, bishops, rooks), (_queen_attacks, _bishop_attacks, _rook_attacks)):
             for i in _scan_lsb_first(p):
-                moves = move(SQUARE_MASK[i], occupied, enemies)
+                moves = move(i, all_pieces) & ~occupied
                 for j in _scan_lsb_first(moves):
-                    yield Move(i, j)
+                    yield _new_move(Move, i | j << 6)
+
+        for i in _scan_lsb_first(knights):
+            for j in _scan_lsb_first(KNIGHT_ATTACKS[i] & ~occupied):
+                yield _new_move(Move, i | j << 6)
 
-        for i in _scan_lsb_first(_king_moves(king) & ~occupied & ~self.attacked_fields(not player)):
-            yield Move(_lsb(king), i)
+        if king:
+            for i in _scan_lsb_first(KING_ATTACKS[_lsb(king)] & ~occupied & ~attacked):
+                yield _new_move(Move, _lsb(king) | i << 6)
 
+        pawn_attacks = PAWN_ATTACKS[player]
+        targets = enemies | (SQUARE_MASK[self.ep_square] if self.ep_square is not None else 0)
+        last_rank = RANK_8 if player else RANK_1
         for p in _scan_lsb_first(pawns):
-            moves = _pawn_moves(SQUARE_MASK[p], player) | (_pawn_attacks(SQUARE_MASK[p], player) & enemies)
+            moves = _pawn_moves(SQUARE_MASK[p], player, ~all_pieces) | (pawn_attacks[p] & targets)
             for j in _scan_lsb_first(moves):
-                yield Move(p, j)
-
-            # ep move
-            if self.ep_move:
-                move = _pawn_attacks(SQUARE_MASK[p], player) & SQUARE_MASK[SQ_NUM[self.ep_move]]
-                if move:
-                    yield Move(p, _lsb(move))
+                if SQUARE_MASK[j] & last_rank:
+                    for promotion in (QUEEN, ROOK, BISHOP, KNIGHT):
+                        yield Move(p, j, promotion)
+                else:
+                    yield _new_move(Move, p | j << 6)
 
         # Castle
-        if self.white_king_side_castle_right and (king & ~self.attacked_fields(not player)):
-            move = (_shift_right(king) | _shift_right_right(king)) & ~self.attacked_fields(not player) & ~occupied
+        if self.white_king_side_castle_right and (king & ~attacked):
+            move = (_shift_right(king) | _shift_right_right(king)) & ~attacked & ~all_pieces
             if move == KSCR_W:
                 yield Move(_lsb(king), _lsb(move))
 
-        if self.black_king_side_castle_right and (king & ~self.attacked_fields(not player)):
-            move = (_shift_right(king) | _shift_right_right(king)) & ~self.attacked_fields(not player) & ~occupied
+        if self.black_king_side_castle_right and (king & ~attacked):
+            move = (_shift_right(king) | _shift_right_right(king)) & ~attacked & ~all_pieces
             if move == KSCR_B:
                 yield Move(_lsb(king), _lsb(move))
 
-        if self.white_queen_side_castle_right and (king & ~self.attacked_fields(not player)):
-            move = (_shift_left(king) | _shift_left_left(king)) & ~self.attacked_fields(not player) & ~occupied
-            if move == QSCR_W:
+        if self.white_queen_side_castle_right and (king & ~attacked):
+            move = (_shift_left(king) | _shift_left_left(king)) & ~attacked & ~all_pieces
+            if move == QSCR_W and not (king << 3) & all_pieces:
                 yield Move(_lsb(king), _msb(move))
 
-        if self.black_queen_side_castle_right and (king & ~self.attacked_fields(not player)):
-            move = (_shift_left(king) | _shift_left_left(king)) & ~self.attacked_fields(not player) & ~occupied
-            if move == SQCR_B:
+        if self.black_queen_side_castle_right and (king & ~attacked):
+            move = (_shift_left(king) | _shift_left_left(king)) & ~attacked & ~all_pieces
+            if move == SQCR_B and not (king << 3) & all_pieces:
                 yield Move(_lsb(king), _msb(move))
 
     def get_piece(self, square):
-        sq = SQUARE_MASK[square]
-        for k, v in self.PIECES.items():
-            if v & sq:
-                return k
+        """
+        returns the symbol of the piece on the square or None
+        """
+        piece = self.squares[square]
+        return None if piece is None else PIECE_SYMBOL[piece]
 
-    def stalemate(self, player=None) -> bool:
-        if player is None:
-            player = self.active_player
-        return self.attacked_fields(not player) & self.PIECES['K' if player else 'k']
+    def attackers(self, by_player, square, occupied=None) -> int:
+        """
+        returns every piece of the specified player that attacks the square
+        :param by_player: attacking player
+        :param square: target square
+        :param occupied: provide a different occupancy of both sides for sliding pieces
+        """
+        if occupied is None:
+            cache = self.attack_cache
+            if cache is None:
+                cache = self.attack_cache = {}
+            key = (by_player, square)
+            attackers = cache.get(key)
+            if attackers is None:
+                attackers = cache[key] = self.attackers(by_player, square, self.occupied)
+            return attackers
+        pieces, base = self.pieces, 6 if by_player else 0
+        queens = pieces[base + QUEEN]
+        return ((KING_ATTACKS[square] & pieces[base + KING]) |
+                (KNIGHT_ATTACKS[square] & pieces[base + KNIGHT]) |
+                (PAWN_ATTACKS[not by_player][square] & pieces[base + PAWN]) |
+                (_rook_attacks(square, occupied) & (pieces[base + ROOK] | queens)) |
+                (_bishop_attacks(square, occupied) & (pieces[base + BISHOP] | queens)))
+
+    def _king_danger(self, player):
+        # squares the king of the player may not step on, sliders see through the king
+        cache = self.attack_cache
+        if cache is None:
+            cache = self.attack_cache = {}
+        key = ('danger', player)
+        danger = cache.get(key)
+        if danger is None:
+            king = self.pieces[(6 if player else 0) + KING]
+            danger = cache[key] = self.attacked_fields(not player, self.occupied & ~king)
+        return danger
+
+    def gen_legal_moves(self, targets=UNIVERSE):
+        """
+        Generate the legal moves of the active player without trying them.
+        Checkers, pinned pieces and the squares that resolve a check are computed once:
+        - in double check only the king may move
+        - in single check other pieces must capture the checker or block its ray
+        - pinned pieces stay on the line through their king and the pinning piece
+        - the king never steps onto a square attacked with the king itself removed
+        :param targets: only generate moves onto these squares, e.g. the enemy pieces for captures
+        """
+        player = self.active_player
+        pieces = self.pieces
+        us = 6 if player else 0
+        them = 6 - us
+        king = pieces[us + KING]
+        if not king:
+            for move in self.gen_pseudo_legal_moves(player):
+                if SQUARE_MASK[move >> 6 & 0x3f] & targets:
+                    yield move
+            return
+
+        king_sq = _lsb(king)
+        occupied = self.occupied
+        own = self.occupancy[player]
+        enemies = self.occupancy[not player]
+        checkers = self.attackers(not player, king_sq)
+        danger = self._king_danger(player)
+
+        for i in _scan_lsb_first(KING_ATTACKS[king_sq] & ~own & ~danger & targets):
+            yield _new_move(Move, king_sq | i << 6)
+
+        # double check
+        if checkers & (checkers - 1):
+            return
+
+        if checkers:
+            checker_sq = _lsb(checkers)
+            target = checkers | BETWEEN[king_sq][checker_sq]
+        else:
+            target = ~own & UNIVERSE
+        target &= targets
+
+        # a piece is pinned if it is the only one between the king and an enemy slider
+        pinned = 0
+        enemy_queens = pieces[them + QUEEN]
+        snipers = ((_rook_attacks(king_sq, enemies) & (pieces[them + ROOK] | enemy_queens)) |
+                   (_bishop_attacks(king_sq, enemies) & (pieces[them + BISHOP] | enemy_queens)))
+        for i in _scan_lsb_first(snipers):
+            blockers = BETWEEN[king_sq][i] & occupied
+            if blockers & own and not blockers & (blockers - 1):
+                pinned |= blockers
+
+        pin_line = LINE[king_sq]
+        for p, attacks in zip((us + QUEEN, us + BISHOP, us + ROOK), (_queen_attacks, _bishop_attacks, _rook_attacks)):
+            for i in _scan_lsb_first(pieces[p]):
+                moves = attacks(i, occupied) & target
+                if SQUARE_MASK[i] & pinned:
+                    moves &= pin_line[i]
+                for j in _scan_lsb_first(moves):
+                    yield _new_move(Move, i | j << 6)
+
+        # a pinned knight can never move
+        for i in _scan_lsb_first(pieces[us + KNIGHT] & ~pinned):
+            for j in _scan_lsb_first(KNIGHT_ATTACKS[i] & target):
+                yield _new_move(Move, i | j << 6)
+
+        pawn_attacks = PAWN_ATTACKS[player]
+        last_rank = RANK_8 if player else RANK_1
+        for p in _scan_lsb_first(pieces[us + PAWN]):
+            moves = (_pawn_moves(SQUARE_MASK[p], player, ~occupied) | (pawn_attacks[p] & enemies)) & target
+            if SQUARE_MASK[p] & pinned:
+                moves &= pin_line[p]
+            for j in _scan_lsb_first(moves):
+                if SQUARE_MASK[j] & last_rank:
+                    for promotion in (QUEEN, ROOK, BISHOP, KNIGHT):
+                        yield Move(p, j, promotion)
+                else:
+                    yield _new_move(Move, p | j << 6)
+
+        # ep captures remove two pieces from one line, so they are verified
+        # against the occupancy after the capture instead of the pin masks
+        if self.ep_square is not None and SQUARE_MASK[self.ep_square] & targets:
+            ep_sq = self.ep_square
+            captured = SQUARE_MASK[ep_sq - 8 if player else ep_sq + 8]
+            for p in _scan_lsb_first(PAWN_ATTACKS[not player][ep_sq] & pieces[us + PAWN]):
+                after = (occupied ^ SQUARE_MASK[p] ^ captured) | SQUARE_MASK[ep_sq]
+                if not self.attackers(not player, king_sq, after) & ~captured:
+                    yield Move(p, ep_sq)
+
+        # Castle
+        if not checkers and king_sq == (E1 if player else E8):
+            all_free = ~occupied & ~danger
+            king_side = SQUARE_MASK[king_sq - 2] & targets
+            queen_side = SQUARE_MASK[king_sq + 2] & targets
+            if player:
+                if king_side and self.white_king_side_castle_right and KSCR_W & all_free == KSCR_W:
+                    yield Move(king_sq, king_sq - 2)
+                if (queen_side and self.white_queen_side_castle_right and QSCR_W & all_free == QSCR_W and
+                        not (king << 3) & occupied):
+                    yield Move(king_sq, king_sq + 2)
+            else:
+                if king_side and self.black_king_side_castle_right and KSCR_B & all_free == KSCR_B:
+                    yield Move(king_sq, king_sq - 2)
+                if (queen_side and self.black_queen_side_castle_right and SQCR_B & all_free == SQCR_B and
+                        not (king << 3) & occupied):
+                    yield Move(king_sq, king_sq + 2)
 
-    def checkmate(self, player=None):
+    def gen_captures(self):
+        """
+        Generate the legal captures of the active player, en passant and capturing promotions included.
+        Only moves onto the enemy pieces and the ep square are generated.
+        """
+        targets = self.occupancy[not self.active_player]
+        if self.ep_square is None:
+            return self.gen_legal_moves(targets)
+        ep_square = self.ep_square
+        squares = self.squares
+        # other pieces may step onto the empty ep square without capturing
+        return (move for move in self.gen_legal_moves(targets | SQUARE_MASK[ep_square])
+                if move >> 6 & 0x3f != ep_square or squares[move & 0x3f] % 6 == PAWN)
+
+    def gen_promotions(self):
+        """
+        Generate the legal promotions of the active player that do not capture
+        """
+        player = self.active_player
+        pawns = self.pieces[(6 if player else 0) + PAWN] & (RANK_7 if player else RANK_2)
+        targets = (pawns << 8 if player else pawns >> 8) & ~self.occupied
+        if not targets:
+            return iter(())
+        return (move for move in self.gen_legal_moves(targets) if move >> 12)
+
+    def see(self, move) -> int:
+        """
+        Static exchange evaluation: the material the side to move wins (negative: loses) if both
+        sides keep capturing on the target square of the move, always with their least valuable
+        attacker, and either side may stop when continuing would lose. Pins are not considered.
+        """
+        from_square, to_square, promotion = move & 0x3f, move >> 6 & 0x3f, move >> 12
+        pieces, squares = self.pieces, self.squares
+        occupied = self.occupied ^ SQUARE_MASK[from_square]
+        piece, victim = squares[from_square] % 6, squares[to_square]
+        if victim is not None:
+            gains = [SEE_VALUES[victim % 6]]
+        elif piece == PAWN and to_square == self.ep_square:
+            gains = [SEE_VALUES[PAWN]]
+            occupied ^= SQUARE_MASK[to_square - 8 if self.active_player else to_square + 8]
+        else:
+            gains = [0]
+        value = SEE_VALUES[piece]
+        if promotion:
+            gains[0] += SEE_VALUES[promotion] - SEE_VALUES[PAWN]
+            value = SEE_VALUES[promotion]
+
+        player = not self.active_player
+        while True:
+            # sliders behind a piece that has captured join in, so attackers are found anew each time
+            attackers = self.attackers(player, to_square, occupied) & occupied
+            if not attackers:
+                break
+            base = 6 if player else 0
+            for piece in (PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING):
+                attacker = attackers & pieces[base + piece]
+                if attacker:
+                    break
+            if piece == KING and self.attackers(not player, to_square, occupied) & occupied:
+                break
+            gains.append(value - gains[-1])
+            occupied ^= attacker & -attacker
+            value = SEE_VALUES[piece]
+            player = not player
+
+        while len(gains) > 1:
+            last = gains.pop()
+            gains[-1] = -max(-gains[-1], last)
+        return gains[0]
+
+    def is_check(self, player=None) -> bool:
+        """
+        True if the king of the player (the side to move by default) is attacked
+        """
         if player is None:
             player = self.active_player
-        occupied = self._all_white_pieces() if player else self._all_black_pieces()
-        king = self.PIECES['K' if player else 'k']
+        king = self.pieces[(6 if player else 0) + KING]
+        return bool(king and self.attackers(not player, _lsb(king)))
 
-        if self.stalemate(player):
-            for m in self.gen_pseudo_legal_moves(player):
-                from_sq, to_sq = m.from_square, m.to_square
+    def has_legal_moves(self) -> bool:
+        """
+        True if the side to move has a legal move, generation stops at the first one
+        """
+        for _ in self.gen_legal_moves():
+            return True
+        return False
 
-                if from_sq == _lsb(king) + 1:
-                    continue
+    def is_checkmate(self) -> bool:
+        return self.is_check() and not self.has_legal_moves()
 
-                occupied = _put(occupied, _mask(to_sq))
-                occupied = _pop(occupied, _mask(from_sq))
+    def is_stalemate(self) -> bool:
+        return not self.is_check() and not self.has_legal_moves()
 
-                if not self.attacked_fields(not player, occupied) & king:
-                    return False
-        return True
+    # older names of the two checks
+    checkmate = is_checkmate
+    stalemate = is_stalemate
 
-    def make_move(self, move):
+    def is_insufficient_material(self) -> bool:
         """
-        Make a move.
-        This includes:
-        - checking if move is legal
-        - checking castling rights
-        - change pos of target piece
-        - replace hostile pieces (if any)
-        - check for ep and castle
-
-        If a move is detected to be illegal the initial state will be restored
+        True if neither side can ever mate: no pawns, rooks or queens and at most one knight or
+        bishop, or only bishops that all stand on squares of one color
         """
-        if move not in list(self.gen_pseudo_legal_moves()):
-            raise ValueError("Invalid Move")
-
-        backup = self.to_fen()
-        capture = False
-
-        def put(k, v):
-            self.PIECES[k] |= v
+        pieces = self.pieces
+        if (pieces[PAWN] | pieces[6 + PAWN] | pieces[ROOK] | pieces[6 + ROOK] |
+                pieces[QUEEN] | pieces[6 + QUEEN]):
+            return False
+        knights = pieces[KNIGHT] | pieces[6 + KNIGHT]
+        bishops = pieces[BISHOP] | pieces[6 + BISHOP]
+        minors = knights | bishops
+        if not minors & (minors - 1):
+            return True
+        return not knights and not (bishops & LIGHT_SQUARES and bishops & DARK_SQUARES)
+
+    def outcome(self, claim_draw=False):
+        """
+        Outcome of the game or None if it goes on.
+        :param claim_draw: also end the game by the fifty-move rule or threefold repetition,
+                           which a player has to claim
+        """
+        if not self.has_legal_moves():
+            if self.is_check():
+                winner = not self.active_player
+                return Outcome(CHECKMATE, int(winner), '1-0' if winner else '0-1')
+            return Outcome(STALEMATE, None, '1/2-1/2')
+        if self.is_insufficient_material():
+            return Outcome(INSUFFICIENT_MATERIAL, None, '1/2-1/2')
+        if claim_draw:
+            if self.is_fifty_moves():
+                return Outcome(FIFTY_MOVES, None, '1/2-1/2')
+            if self.is_repetition():
+                return Outcome(THREEFOLD_REPETITION, None, '1/2-1/2')
+        return None
+
+    def _add_piece(self, piece, square):
+        # piece and occupancy bitboards, the mailbox and the hash key are always updated together
+        mask = SQUARE_MASK[square]
+        self.pieces[piece] |= mask
+        self.occupancy[piece >= 6] |= mask
+        self.occupied |= mask
+        self.squares[square] = piece
+        self.zobrist ^= ZOBRIST_PIECES[piece][square]
+        self.mg_score += EVAL_MG[piece][square]
+        self.eg_score += EVAL_EG[piece][square]
+        self.phase += EVAL_PHASE[piece]
+
+    def _remove_piece(self, piece, square):
+        mask = SQUARE_MASK[square]
+        self.pieces[piece] &= ~mask
+        self.occupancy[piece >= 6] &= ~mask
+        self.occupied &= ~mask
+        self.squares[square] = None
+        self.zobrist ^= ZOBRIST_PIECES[piece][square]
+        self.mg_score -= EVAL_MG[piece][square]
+        self.eg_score -= EVAL_EG[piece][square]
+        self.phase -= EVAL_PHASE[piece]
+
+    def _castling_key(self):
+        key = 0
+        if self.white_king_side_castle_right:
+            key ^= ZOBRIST_CASTLING[0]
+        if self.white_queen_side_castle_right:
+            key ^= ZOBRIST_CASTLING[1]
+        if self.black_king_side_castle_right:
+            key ^= ZOBRIST_CASTLING[2]
+        if self.black_queen_side_castle_right:
+            key ^= ZOBRIST_CASTLING[3]
+        return key
+
+    def _ep_key(self, player):
+        """
+        the ep part of the hash key, only hashed if a pawn of player can capture en passant,
+        otherwise positions after a double push would never repeat
+        """
+        ep = self.ep_square
+        if ep is not None and PAWN_ATTACKS[not player][ep] & self.pieces[(6 if player else 0) + PAWN]:
+            return ZOBRIST_EP[ep & 7]
+        return 0
 
-        def pop(k, v):
-            self.PIECES[k] &= ~v
+    def _zobrist_from_scratch(self):
+        """
+        compute the hash key of the current position without the incremental updates
+        """
+        key = 0
+        for piece, p in enumerate(self.pieces):
+            for k in _scan_lsb_first(p):
+                key ^= ZOBRIST_PIECES[piece][k]
+        if not self.active_player:
+            key ^= ZOBRIST_TURN
+        key ^= self._castling_key() ^ self._ep_key(self.active_player)
+        return key
 
-        from_square, to_square = move.from_square, move.to_square
-        from_square_mask, to_square_mask = _mask(from_square), _mask(to_square)
-        from_piece, to_piece = self.get_piece(from_square), self.get_piece(to_square)
+    def evaluate(self, full=False):
+        """
+        Tapered material and piece-square score in centipawns from the point of view of the side to move.
+        :param full: recompute the score from the bitboards instead of using the incremental sums,
+                     both always give the same result
+        """
+        mg, eg, phase = self._evaluation_from_scratch() if full else (self.mg_score, self.eg_score, self.phase)
+        phase = min(phase, MAX_PHASE)
+        score = (mg * phase + eg * (MAX_PHASE - phase)) // MAX_PHASE
+        return score if self.active_player else -score
 
-        # move and remove hostile piece if it exists
-        pop(from_piece, from_square_mask)
-        put(from_piece, to_square_mask)
+    def _evaluation_from_scratch(self):
+        """
+        middle game sum, end game sum and phase of the current position without the incremental updates
+        """
+        mg = eg = phase = 0
+        for piece, p in enumerate(self.pieces):
+            for k in _scan_lsb_first(p):
+                mg += EVAL_MG[piece][k]
+                eg += EVAL_EG[piece][k]
+                phase += EVAL_PHASE[piece]
+        return mg, eg, phase
 
-        if to_piece is not None:
-            pop(to_piece, to_square_mask)
-            capture = True
+    def push(self, move):
+        """
+        Play a move without checking it and remember how to take it back.
+        The undo stack only holds the captured piece, the castling rights,
+        the ep square, the clocks and the attack maps, so a push/pop pair never has to touch a FEN.
+        This includes:
+        - change pos of target piece
+        - replace hostile pieces (if any)
+        - check for ep, castle and promotion
+        - update castling rights
+        """
+        player = self.active_player
+        us = 6 if player else 0
+        from_square, to_square, promotion = move & 0x3f, move >> 6 & 0x3f, move >> 12
+        piece, captured = self.squares[from_square], self.squares[to_square]
+
+        self.move_stack.append((move, captured,
+                                (self.white_king_side_castle_right, self.white_queen_side_castle_right,
+                                 self.black_king_side_castle_right, self.black_queen_side_castle_right),
+                                self.ep_square, self.half_move_clock, self.move_number, self.zobrist,
+                                self.attack_cache))
+        self.attack_cache = None
+
+        # castling rights and ep square are hashed out here and in again once they are updated
+        self.zobrist ^= self._castling_key() ^ self._ep_key(player)
+        ep = self.ep_square
+
+        # remove hostile piece if it exists and move
+        if captured is not None:
+            self._remove_piece(captured, to_square)
+        self._remove_piece(piece, from_square)
+        self._add_piece(us + promotion if promotion else piece, to_square)
+        capture = captured is not None
+
+        self.ep_square = None
+        if piece == us + PAWN:
+            # kill
+            if to_square == ep:
+                self._remove_piece(6 - us + PAWN, to_square - 8 if player else to_square + 8)
+                capture = True
+            # move
+            elif abs(from_square - to_square) == 16:
+                self.ep_square = to_square - 8 if player else to_square + 8
 
         # castle
         # king was moved but the distance to it´s new pos is greater than 1
         # king is already on it´s new pos, so only the rooks needs to be moved
         # in every case the king looses it´s future right to castle
-        if from_piece == 'K' or from_piece == 'k':
-            if self.active_player:
+        elif piece == us + KING:
+            if player:
                 self.white_king_side_castle_right, self.white_queen_side_castle_right = False, False
             else:
                 self.black_king_side_castle_right, self.black_queen_side_castle_right = False, False
 
-            if not _king_moves(from_square_mask) & to_square_mask:
-                r = 'R' if self.active_player else 'r'
+            if abs(from_square - to_square) == 2:
                 if from_square > to_square:
                     # king side castle
-                    corner = BB_H1 if self.active_player else BB_H8
-                    pop(r, corner)
-                    put(r, corner << 2)
-
+                    corner = H1 if player else H8
+                    self._remove_piece(us + ROOK, corner)
+                    self._add_piece(us + ROOK, corner + 2)
                 else:
                     # queen side castle
-                    corner = BB_A1 if self.active_player else BB_A8
-                    pop(r, corner)
-                    put(r, corner >> 3)
-
-        ep = self.ep_move
-        self.ep_move = None
-        # ep moves
-        if from_piece == 'P' or from_piece == 'p':
-            # kill
-            if ep:
-                if to_square_mask == _mask(SQ_NUM[ep]):
-                    pop('p' if self.active_player else 'P',
-                        _mask(to_square - 8 if self.active_player else to_square + 8))
-                    capture = True
-            # move
-            if abs(from_square - to_square) > 8:
-                self.ep_move = F_NAME[to_square - 8 if self.active_player else to_square + 8]
-
-        # move was illegal if king is attacked AFTER move
-        # Undo -> load Board from backup-FEN
-        if self.stalemate():
-            self.from_fen(backup)
-            raise ValueError("Illegal move -> Stalemate!")
-
-        # if a rook was moved, update castle rights
-        if from_piece == 'R':  # white
-            if from_square_mask == BB_A1:
-                self.white_queen_side_castle_right = False
-            elif from_square_mask == BB_A8:
+                    corner = A1 if player else A8
+                    self._remove_piece(us + ROOK, corner)
+                    self._add_piece(us + ROOK, corner - 3)
+
+        # a rook that leaves or is captured on its corner ends that castling right
+        touched = SQUARE_MASK[from_square] | SQUARE_MASK[to_square]
+        if touched & CORNERS:
+            if touched & BB_H1:
                 self.white_king_side_castle_right = False
-
-        elif from_piece == 'r':  # black
-            if from_square_mask == BB_A1:
-                self.black_queen_side_castle_right = False
-            elif from_square_mask == BB_A8:
+            if touched & BB_A1:
+                self.white_queen_side_castle_right = False
+            if touched & BB_H8:
                 self.black_king_side_castle_right = False
+            if touched & BB_A8:
+                self.black_queen_side_castle_right = False
+
+        self.zobrist ^= self._castling_key() ^ ZOBRIST_TURN ^ self._ep_key(not player)
 
-        # else the move was legal
         # switch players
-        self.active_player = not self.active_player
-        # update move count
+        self.active_player = not player
+        # update move count, captures and pawn moves can not be taken back
         self.half_move_clock += 1
-        if capture:
+        if capture or piece == us + PAWN:
             self.half_move_clock = 0
         if self.active_player:
             self.move_number += 1
 
+    def pop(self):
+        """
+        Take back the last move made by push and return it.
+        """
+        move, captured, castling_rights, ep, half_move_clock, move_number, zobrist, attack_cache = \
+            self.move_stack.pop()
+        player = not self.active_player
+        us = 6 if player else 0
+        from_square, to_square = move & 0x3f, move >> 6 & 0x3f
+        piece = self.squares[to_square]
+
+        self._remove_piece(piece, to_square)
+        if move >> 12:
+            piece = us + PAWN
+        self._add_piece(piece, from_square)
+        if captured is not None:
+            self._add_piece(captured, to_square)
+
+        if piece == us + PAWN:
+            if to_square == ep:
+                self._add_piece(6 - us + PAWN, to_square - 8 if player else to_square + 8)
+
+        elif piece == us + KING and abs(from_square - to_square) == 2:
+            if from_square > to_square:
+                corner = H1 if player else H8
+                self._remove_piece(us + ROOK, corner + 2)
+            else:
+                corner = A1 if player else A8
+                self._remove_piece(us + ROOK, corner - 3)
+            self._add_piece(us + ROOK, corner)
+
+        (self.white_king_side_castle_right, self.white_queen_side_castle_right,
+         self.black_king_side_castle_right, self.black_queen_side_castle_right) = castling_rights
+        self.ep_square = ep
+        self.half_move_clock = half_move_clock
+        self.move_number = move_number
+        self.active_player = player
+        self.zobrist = zobrist
+        self.attack_cache = attack_cache
+        return move
+
+    def make_move(self, move):
+        """
+        Make a move.
+        This includes:
+        - checking if move is legal
+        - playing it with push
+        """
+        if move not in list(self.gen_legal_moves()):
+            raise ValueError("Invalid Move")
+
+        self.push(move)
+
+    def is_repetition(self, count=3):
+        """
+        True if the position occurred count times, counting the current one.
+        Earlier positions are taken from the move stack, which holds the key of every position
+        before a move. Only positions with the same side to move since the last capture or pawn
+        move can repeat, so the scan stops after half_move_clock plies.
+        """
+        key, stack = self.zobrist, self.move_stack
+        end = len(stack) - min(self.half_move_clock, len(stack))
+        for i in range(len(stack) - 4, end - 1, -2):
+            if stack[i][6] == key:
+                count -= 1
+                if count <= 1:
+                    return True
+        return count <= 1
+
+    def is_fifty_moves(self):
+        """
+        True if neither side captured or moved a pawn in the last fifty moves
+        """
+        return self.half_move_clock >= 100
+
+    def _is_legal(self, move):
+        # only for moves that are pseudo-legal, the king must not be attacked afterwards
+        player = self.active_player
+        self.push(move)
+        king = self.pieces[(6 if player else 0) + KING]
+        legal = not king or not self.attackers(not player, _lsb(king))
+        self.pop()
+        return legal
+
+    def _origins(self, piece_type, square):
+        """
+        pieces of the given type of the active player that attack or, for pawns, push to the square
+        """
+        player = self.active_player
+        own = self.pieces[(6 if player else 0) + piece_type]
+        if piece_type == KNIGHT:
+            return KNIGHT_ATTACKS[square] & own
+        if piece_type == BISHOP:
+            return _bishop_attacks(square, self.occupied) & own
+        if piece_type == ROOK:
+            return _rook_attacks(square, self.occupied) & own
+        if piece_type == QUEEN:
+            return _queen_attacks(square, self.occupied) & own
+        if piece_type == KING:
+            return KING_ATTACKS[square] & own
+        if self.squares[square] is not None or square == self.ep_square:
+            return PAWN_ATTACKS[not player][square] & own
+        # pushes, a double step needs the square in between to be empty
+        single = square - 8 if player else square + 8
+        if not 0 <= single < 64:
+            return 0
+        if SQUARE_MASK[single] & own:
+            return SQUARE_MASK[single]
+        double = single - 8 if player else single + 8
+        if (self.squares[single] is None and SQUARE_MASK[square] & (RANK_4 if player else RANK_5) and
+                SQUARE_MASK[double] & own):
+            return SQUARE_MASK[double]
+        return 0
+
+    def parse_san(self, san):
+        """
+        Parse a move in standard algebraic notation, e.g. Nbd7, exd6, e8=Q+ or O-O.
+        Only the pieces that can reach the target square are tried, so the move list is not
+        generated. Raises ValueError for malformed, illegal or ambiguous moves.
+        """
+        text = san.rstrip('+#!?')
+        player = self.active_player
+        if text in SAN_CASTLING:
+            king = self.pieces[(6 if player else 0) + KING]
+            move = Move(_lsb(king), _lsb(king) + SAN_CASTLING[text]) if king else None
+            if move is None or move not in self.gen_legal_moves():
+                raise ValueError("Illegal move: {}".format(san))
+            return move
+
+        promotion = KING
+        if len(text) > 2 and text[-1] in 'QRBN':
+            promotion = SAN_PIECES[text[-1]]
+            text = text[:-2] if text[-2] == '=' else text[:-1]
+        piece_type = PAWN
+        if text[:1] in SAN_PIECES:
+            piece_type = SAN_PIECES[text[0]]
+            text = text[1:]
+        square = SQ_NUM.get(text[-2:])
+        if square is None or (promotion and piece_type != PAWN):
+            raise ValueError("Invalid SAN: {}".format(san))
+
+        origins = self._origins(piece_type, square)
+        capture = self.squares[square] is not None or (piece_type == PAWN and square == self.ep_square)
+        for c in text[:-2]:
+            if c in SAN_FILES:
+                origins &= SAN_FILES[c]
+            elif c in SAN_RANKS:
+                origins &= SAN_RANKS[c]
+            elif c != 'x':
+                raise ValueError("Invalid SAN: {}".format(san))
+        if (self.squares[square] is not None and (self.squares[square] >= 6) == player or
+                piece_type == PAWN and bool(promotion) != bool(SQUARE_MASK[square] & (RANK_8 | RANK_1)) or
+                piece_type == PAWN and ('x' in text) != capture):
+            origins = 0
+
+        moves = [Move(i, square, promotion) for i in _scan_lsb_first(origins)]
+        if len(moves) > 1 or (moves and not self._is_legal(moves[0])):
+            moves = [move for move in moves if self._is_legal(move)]
+        if len(moves) != 1:
+            raise ValueError("{} move: {}".format("Ambiguous" if moves else "Illegal", san))
+        return moves[0]
+
+    def san(self, move):
+        """
+        standard algebraic notation of a legal move, with + or # for check and mate
+        """
+        from_square, to_square, promotion = move & 0x3f, move >> 6 & 0x3f, move >> 12
+        piece = self.squares[from_square]
+        if piece is None:
+            raise ValueError("Invalid Move")
+        piece_type = piece % 6
+
+        if piece_type == KING and abs(from_square - to_square) == 2:
+            text = 'O-O' if to_square < from_square else 'O-O-O'
+        elif piece_type == PAWN:
+            text = SQUARE_NAME[to_square]
+            if from_square & 7 != to_square & 7:
+                text = SQUARE_NAME[from_square][0] + 'x' + text
+            if promotion:
+                text += '=' + SAN_SYMBOLS[promotion]
+        else:
+            text = SAN_SYMBOLS[piece_type]
+            others = [i for i in _scan_lsb_first(self._origins(piece_type, to_square) & ~SQUARE_MASK[from_square])
+                      if self._is_legal(Move(i, to_square))]
+            if others:
+                files = [i & 7 for i in others]
+                if from_square & 7 not in files:
+                    text += SQUARE_NAME[from_square][0]
+                elif from_square >> 3 not in [i >> 3 for i in others]:
+                    text += SQUARE_NAME[from_square][1]
+                else:
+                    text += SQUARE_NAME[from_square]
+            if self.squares[to_square] is not None:
+                text += 'x'
+            text += SQUARE_NAME[to_square]
+
+        player = self.active_player
+        self.push(move)
+        king = self.pieces[(0 if player else 6) + KING]
+        if king and self.attackers(player, _lsb(king)):
+            text += '#' if next(self.gen_legal_moves(), None) is None else '+'
+        self.pop()
+        return text
+
+
+class Move(int):
+    """
+    A move packed into a 16 bit integer:
+    - bits 0-5: from square
+    - bits 6-11: to square
+    - bits 12-14: promotion piece type (KING = no promotion)
+    Castling and ep are told apart by the board, so a move parsed from UCI equals the generated one.
+    Being an int, a move compares and hashes by value and move lists fit into array('H') buffers,
+    Move.from_code turns such a value back into a Move.
+    """
+    __slots__ = ()
+
+    def __new__(cls, from_square, to_square, promotion=0):
+        return int.__new__(cls, from_square | to_square << 6 | promotion << 12)
+
+    @classmethod
+    def from_code(cls, code):
+        return int.__new__(cls, code)
 
-class Move:
+    @property
+    def from_square(self):
+        return self & 0x3f
+
+    @property
+    def to_square(self):
+        return self >> 6 & 0x3f
 
-    def __init__(self, from_square, to_square, promotion=False):
-        self.from_square = from_square
-        self.to_square = to_square
-        self.promotion = promotion
+    @property
+    def promotion(self):
+        return self >> 12
 
     @property
     def uci(self):
-        keys = list(SQ_NUM.keys())
-        vals = list(SQ_NUM.values())
-        return "{f}{t}{p}".format(
-            f=keys[vals.index(self.from_square)],
-            t=keys[vals.index(self.to_square)],
-            p=self.promotion if self.promotion else ""
-        )
+        return SQUARE_NAME[self & 0x3f] + SQUARE_NAME[self >> 6 & 0x3f] + PROMOTION_SYMBOLS[self >> 12]
 
     @staticmethod
     def from_uci(uci):
         uci = uci.lower()
-        m = re.match('([a-h][1-8])([a-h][1-8])(.)?', uci)
-
-        if m is None:
+        if len(uci) not in (4, 5) or uci[:2] not in SQ_NUM or uci[2:4] not in SQ_NUM:
             raise ValueError("Invalid uci string provided!")
 
-        promotion = m.group(3)
-        if promotion is not None and promotion not in PROMOTION:
+        promotion = PROMOTION_PIECES.get(uci[4:], -1)
+        if promotion < 0:
             raise ValueError("Invalid Promotion Piece provided!")
-        return Move(SQ_NUM[m.group(1)], SQ_NUM[m.group(2)], bool(promotion))
-
-    def __eq__(self, other):
-        return (self.from_square == other.from_square and
-                self.to_square == other.to_square and
-                self.promotion == other.promotion)
+        return Move(SQ_NUM[uci[:2]], SQ_NUM[uci[2:4]], promotion)
 
     def __repr__(self):
         return self.uci
 
-    def __hash__(self):
-        return hash((self.to_square, self.from_square, self.promotion))
+    __str__ = __repr__
+
+    def __getnewargs__(self):
+        return self & 0x3f, self >> 6 & 0x3f, self >> 12
 
     def __copy__(self):
-        return type(self)(self.from_square, self.to_square, self.promotion)
+        return self
+
+
+# move generators build moves from their code directly, skipping Move.__new__
+_new_move = int.__new__
+
+
+class TranspositionTable:
+    """
+    A fixed size hash table for search results, keyed by the zobrist key of a position.
+    Entries live in two flat 64 bit arrays (keys and packed data) instead of Python objects.
+    Buckets hold two entries: the first one is depth-preferred and only replaced by deeper
+    or equally deep results of the same or a newer search, the second one is always replaced.
+    Packed data layout:
+    - bits 0-15: best move
+    - bits 16-23: depth
+    - bits 24-25: bound
+    - bits 26-31: generation
+    - bits 32-63: score (+ 2^31)
+    """
+
+    ENTRY_SIZE = 16  # bytes per entry: key and data
+
+    def __init__(self, size_mb=16):
+        """
+        allocate a table that fits into size_mb megabytes
+        """
+        buckets = 1
+        while buckets * 4 * self.ENTRY_SIZE <= size_mb * 1024 * 1024:
+            buckets *= 2
+        self.mask = buckets - 1
+        self.keys = array('Q', [0]) * (2 * buckets)
+        self.data = array('Q', [0]) * (2 * buckets)
+        self.generation = 0
+
+    def __len__(self):
+        return len(self.keys)
+
+    def clear(self):
+        for a in (self.keys, self.data):
+            a[:] = array('Q', [0]) * len(a)
+        self.generation = 0
+
+    def new_search(self):
+        """
+        age all entries, results of older searches are replaced first
+        """
+        self.generation = (self.generation + 1) & 0x3f
+
+    def store(self, key, depth, bound, score, move=None):
+        i = (key & self.mask) << 1
+        keys, data = self.keys, self.data
+        entry = ((move or 0) | min(max(depth, 0), 0xff) << 16 | bound << 24 | self.generation << 26 |
+                 (score + 0x80000000) << 32)
+
+        old = data[i]
+        if keys[i] == key or depth >= (old >> 16 & 0xff) or (old >> 26 & 0x3f) != self.generation:
+            # keep the best move of an earlier search of the same position
+            if keys[i] == key and move is None:
+                entry |= old & 0xffff
+            keys[i], data[i] = key, entry
+        else:
+            keys[i + 1], data[i + 1] = key, entry
+
+    def probe(self, key):
+        """
+        returns (depth, bound, score, move) of a stored position or None
+        """
+        i = (key & self.mask) << 1
+        keys = self.keys
+        if keys[i] == key:
+            entry = self.data[i]
+        elif keys[i + 1] == key:
+            entry = self.data[i + 1]
+        else:
+            return None
+        move = entry & 0xffff
+        return (entry >> 16 & 0xff, entry >> 24 & 0x3, (entry >> 32) - 0x80000000,
+                Move.from_code(move) if move else None)
+
+
+# PERFT
+
+# reference positions with their published node counts for depth 1, 2, ...
+PERFT_POSITIONS = [
+    ("start", BASEBOARD,
+     [20, 400, 8902, 197281, 4865609, 119060324]),
+    ("kiwipete", "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+     [48, 2039, 97862, 4085603, 193690690]),
+    ("position 3", "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1",
+     [14, 191, 2812, 43238, 674624, 11030083]),
+    ("position 4", "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1",
+     [6, 264, 9467, 422333, 15833292]),
+    ("position 5", "rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8",
+     [44, 1486, 62379, 2103487, 89941194]),
+    ("position 6", "r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10",
+     [46, 2079, 89890, 3894594, 164075551]),
+]
+
+
+def perft(board, depth, tt=None):
+    """
+    Count the leaf nodes of the legal move tree of the given depth.
+    Subtree counts are cached in the transposition table if one is given.
+    :param board: position to start from, it is restored when done
+    :param depth: number of plies
+    :param tt: optional TranspositionTable
+    """
+    if depth <= 0:
+        return 1
+    moves = list(board.gen_legal_moves())
+    if depth == 1:
+        return len(moves)
+    if tt is not None:
+        entry = tt.probe(board.zobrist)
+        if entry is not None and entry[0] == depth:
+            return entry[2]
+
+    nodes = 0
+    for move in moves:
+        board.push(move)
+        nodes += perft(board, depth - 1, tt)
+        board.pop()
+
+    if tt is not None and nodes < 0x80000000:
+        tt.store(board.zobrist, depth, EXACT, nodes)
+    return nodes
+
+
+def divide(board, depth, tt=None):
+    """
+    Perft split up by root move, returns a dict mapping every legal move to its node count.
+    Raises ValueError for a depth below 1, there are no root moves to split by.
+    """
+    if depth < 1:
+        raise ValueError("divide needs a depth of at least 1, got {}".format(depth))
+    result = {}
+    for move in list(board.gen_legal_moves()):
+        board.push(move)
+        result[move] = perft(board, depth - 1, tt)
+        board.pop()
+    return result
+
+
+def _perft_command(args):
+    tt = TranspositionTable(args.hash) if args.hash else None
+
+    if args.fen:
+        board = Board(args.fen)
+        start = time.perf_counter()
+        if args.jobs > 1 or args.divide:
+            if args.jobs > 1:
+                from parallel import parallel_divide
+                counts = parallel_divide(board, args.depth, args.jobs, args.hash)
+            else:
+                counts = divide(board, args.depth, tt)
+            for move, nodes in counts.items() if args.divide else ():
+                print("{}: {}".format(move.uci, nodes))
+            nodes = sum(counts.values())
+        else:
+            nodes = perft(board, args.depth, tt)
+        elapsed = time.perf_counter() - start
+        print("nodes {} time {:.2f}s nps {:.0f}".format(nodes, elapsed, nodes / elapsed if elapsed else 0))
+        return 0
+
+    failures = 0
+    total_nodes, total_time = 0, 0.0
+    for name, fen, expected in PERFT_POSITIONS:
+        board = Board(fen)
+        for depth in range(1, min(args.depth, len(expected)) + 1):
+            start = time.perf_counter()
+            nodes = perft(board, depth, tt)
+            elapsed = time.perf_counter() - start
+            total_nodes, total_time = total_nodes + nodes, total_time + elapsed
+            ok = nodes == expected[depth - 1]
+            failures += not ok
+            print("{:<12} depth {} nodes {:>10} expected {:>10} {} {:8.2f}s {:>8.0f} nps".format(
+                name, depth, nodes, expected[depth - 1], "ok  " if ok else "FAIL", elapsed,
+                nodes / elapsed if elapsed else 0))
+    print("total nodes {} time {:.2f}s nps {:.0f}".format(
+        total_nodes, total_time, total_nodes / total_time if total_time else 0))
+    return 1 if failures else 0
+
+
+def _depth(text):
+    depth = int(text)
+    if depth < 1:
+        raise argparse.ArgumentTypeError("depth must be at least 1, got {}".format(depth))
+    return depth
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m chess")
+    commands = parser.add_subparsers(dest="command")
+    commands.required = True
+
+    perft_parser = commands.add_parser("perft", help="validate and benchmark move generation")
+    perft_parser.add_argument("-d", "--depth", type=_depth, default=3, help="maximum depth (default: 3)")
+    perft_parser.add_argument("--fen", help="count this position instead of the reference suite")
+    perft_parser.add_argument("--divide", action="store_true", help="print node counts per root move (with --fen)")
+    perft_parser.add_argument("--hash", type=int, default=0, help="transposition table size in MB (default: off)")
+    perft_parser.add_argument("-j", "--jobs", type=int, default=1,
+                              help="worker processes, splits the root moves (with --fen, default: 1)")
+    perft_parser.set_defaults(func=_perft_command)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
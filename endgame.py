@@ -0,0 +1,347 @@
+"""
+Endgame tables built by retrograde analysis
+
+Tables cover a strong side with a few pieces against a bare king (KQK, KRK, KPK, KBNK) and hold
+the distance to mate in plies for every position, or a draw. They are generated backwards from
+the mates: a position with the strong side to move is won if one move reaches a lost position,
+a position with the weak side to move is lost once every move reaches a won one.
+
+All tables are written into one indexed binary file which EndgameTables memory-maps, so a probe
+is a single byte lookup. Positions are stored with the strong side as white; boards where black
+is the strong side are mirrored. Pawnless tables use all 8 board symmetries (the white king is
+kept in the a1-d1-d4 triangle), tables with pawns only the mirror along the d/e file line.
+
+    python endgame.py tables.egtb [--tables KQK KRK KPK KBNK]
+"""
+
+import argparse
+import mmap
+import struct
+import sys
+import time
+from collections import OrderedDict, namedtuple
+
+from chess import (BLACK, WHITE, KING, QUEEN, KNIGHT, BISHOP, ROOK, PAWN, SQUARE_MASK, KING_ATTACKS,
+                   KNIGHT_ATTACKS, PAWN_ATTACKS, RANK_1, RANK_8, SAN_SYMBOLS, _bishop_attacks, _lsb, _queen_attacks,
+                   _rook_attacks, _scan_lsb_first)
+
+# piece types of the strong side besides its king
+TABLES = OrderedDict([('KQK', [QUEEN]), ('KRK', [ROOK]), ('KPK', [PAWN]), ('KBNK', [BISHOP, KNIGHT])])
+PROMOTION_TABLES = [('KQK', QUEEN), ('KRK', ROOK)]  # KPK looks up promotions here
+NAME_ORDER = [QUEEN, ROOK, BISHOP, KNIGHT, PAWN]
+
+MAGIC = b'EGTB'
+HEADER = struct.Struct('<4sI')
+INDEX_ENTRY = struct.Struct('<8sQQ')  # name, offset and length of a table
+
+# the strong side and the weak side to move, the first and the second half of every table
+STRONG, WEAK = range(2)
+
+EndgameProbe = namedtuple('EndgameProbe', ['wdl', 'dtm'])
+
+
+def _transforms():
+    # the 8 symmetries of the board on (file, rank) coordinates, file A = 0 and rank 1 = 0
+    maps = [lambda f, r: (f, r), lambda f, r: (7 - f, r), lambda f, r: (f, 7 - r), lambda f, r: (7 - f, 7 - r),
+            lambda f, r: (r, f), lambda f, r: (7 - r, f), lambda f, r: (r, 7 - f), lambda f, r: (7 - r, 7 - f)]
+    tables = []
+    for transform in maps:
+        table = []
+        for sq in range(64):
+            f, r = transform(7 - (sq & 7), sq >> 3)
+            table.append(r * 8 + 7 - f)
+        tables.append(table)
+    return tables
+
+
+TRANSFORMS = _transforms()
+
+_ATTACKS = {
+    QUEEN: _queen_attacks,
+    ROOK: _rook_attacks,
+    BISHOP: _bishop_attacks,
+    KNIGHT: lambda sq, occupied: KNIGHT_ATTACKS[sq],
+    PAWN: lambda sq, occupied: PAWN_ATTACKS[WHITE][sq],
+}
+
+
+class _Table(object):
+    """
+    Index arithmetic and move generation of one material set, the strong side is white.
+    index = ((side * kings + king) * 64 + weak king) * 64 ** pieces + piece squares
+    """
+
+    def __init__(self, pieces):
+        self.pieces = pieces
+        if PAWN in pieces:
+            transforms = [0, 1]
+            region = [sq for sq in range(64) if 7 - (sq & 7) <= 3]
+        else:
+            transforms = range(8)
+            region = [sq for sq in range(64) if 7 - (sq & 7) <= 3 and sq >> 3 <= 7 - (sq & 7)]
+        self.kings = region
+        self.king_index = dict((sq, i) for i, sq in enumerate(region))
+        # every symmetry that moves the white king into the region, a king on the diagonal has two
+        self.candidates = [[TRANSFORMS[t] for t in transforms if TRANSFORMS[t][sq] in self.king_index]
+                           for sq in range(64)]
+        self.size = 2 * len(region) * 64 ** (len(pieces) + 1)
+        self.half = self.size // 2
+
+    def index(self, side, king, weak_king, squares):
+        """
+        index of a position, the smallest one over the symmetries that keep the king in the region
+        """
+        best = None
+        for transform in self.candidates[king]:
+            i = (side * len(self.kings) + self.king_index[transform[king]]) * 64 + transform[weak_king]
+            for sq in squares:
+                i = i * 64 + transform[sq]
+            if best is None or i < best:
+                best = i
+        return best
+
+    def decode(self, i):
+        squares = []
+        for _ in self.pieces:
+            squares.append(i & 63)
+            i >>= 6
+        squares.reverse()
+        weak_king = i & 63
+        i >>= 6
+        return i // len(self.kings), self.kings[i % len(self.kings)], weak_king, squares
+
+    def attacks(self, king, squares, occupied):
+        attacks = KING_ATTACKS[king]
+        for piece, sq in zip(self.pieces, squares):
+            attacks |= _ATTACKS[piece](sq, occupied)
+        return attacks
+
+    def valid(self, i):
+        """
+        returns the decoded position if the index is the canonical index of a legal position
+        """
+        side, king, weak_king, squares = self.decode(i)
+        if king == weak_king:
+            return None
+        occupied = SQUARE_MASK[king] | SQUARE_MASK[weak_king]
+        for piece, sq in zip(self.pieces, squares):
+            if occupied & SQUARE_MASK[sq] or piece == PAWN and SQUARE_MASK[sq] & (RANK_1 | RANK_8):
+                return None
+            occupied |= SQUARE_MASK[sq]
+        if KING_ATTACKS[king] & SQUARE_MASK[weak_king] or self.index(side, king, weak_king, squares) != i:
+            return None
+        # the weak king can not be in check with the strong side to move
+        if side == STRONG and self.attacks(king, squares, occupied) & SQUARE_MASK[weak_king]:
+            return None
+        return side, king, weak_king, squares, occupied
+
+    def weak_moves(self, king, weak_king, squares, occupied):
+        """
+        indices reached by the legal weak king moves, the number of captures (they leave the table)
+        and whether the weak king is in check
+        """
+        attacked = self.attacks(king, squares, occupied & ~SQUARE_MASK[weak_king])
+        successors, captures = set(), 0
+        for to in _scan_lsb_first(KING_ATTACKS[weak_king] & ~attacked):
+            if SQUARE_MASK[to] & occupied:
+                captures += 1
+            else:
+                successors.add(self.index(STRONG, king, to, squares))
+        return successors, captures, bool(attacked & SQUARE_MASK[weak_king])
+
+    def weak_predecessors(self, king, weak_king, squares, occupied):
+        # weak king moves that lead here, the strong side is to move here
+        near = KING_ATTACKS[king]
+        return set(self.index(WEAK, king, sq, squares)
+                   for sq in _scan_lsb_first(KING_ATTACKS[weak_king] & ~occupied & ~near))
+
+    def strong_predecessors(self, king, weak_king, squares, occupied):
+        # strong moves (captures and promotions excluded) that lead here, the weak side is to move here
+        result = set()
+        weak = SQUARE_MASK[weak_king]
+        for sq in _scan_lsb_first(KING_ATTACKS[king] & ~occupied & ~KING_ATTACKS[weak_king]):
+            if not self.attacks(sq, squares, occupied ^ SQUARE_MASK[king] | SQUARE_MASK[sq]) & weak:
+                result.add(self.index(STRONG, sq, weak_king, squares))
+        for n, (piece, origin) in enumerate(zip(self.pieces, squares)):
+            if piece == PAWN:
+                single = origin - 8
+                targets = SQUARE_MASK[single] & ~occupied & ~RANK_1
+                if origin >> 3 == 3 and targets and not SQUARE_MASK[single - 8] & occupied:
+                    targets |= SQUARE_MASK[single - 8]
+            else:
+                targets = _ATTACKS[piece](origin, occupied) & ~occupied
+            for sq in _scan_lsb_first(targets):
+                before = squares[:n] + [sq] + squares[n + 1:]
+                if not self.attacks(king, before, occupied ^ SQUARE_MASK[origin] | SQUARE_MASK[sq]) & weak:
+                    result.add(self.index(STRONG, king, weak_king, before))
+        return result
+
+    def generate(self, promotions=None, log=None):
+        """
+        Build the table, returns a bytearray holding the plies to mate + 1 for every index, 0 for draws.
+        :param promotions: list of (_Table, bytearray, piece type) to look up pawn promotions
+        """
+        values = bytearray(self.size)
+        counts = bytearray(self.half)  # moves of the weak side that do not lose yet
+        buckets = [[] for _ in range(256)]  # positions by plies to mate
+
+        for i in range(self.half, self.size):
+            position = self.valid(i)
+            if position is None:
+                continue
+            successors, captures, check = self.weak_moves(*position[1:])
+            counts[i - self.half] = len(successors) + captures
+            if not successors and not captures and check:
+                buckets[0].append(i)
+
+        for table, table_values, piece in promotions or ():
+            for i in range(self.half):
+                position = self.valid(i)
+                if position is None:
+                    continue
+                _, king, weak_king, squares, occupied = position
+                for n, (p, sq) in enumerate(zip(self.pieces, squares)):
+                    if p == PAWN and sq >> 3 == 6 and not SQUARE_MASK[sq + 8] & occupied:
+                        # the table of the promoted piece, the pawn was the only other piece
+                        value = table_values[table.index(WEAK, king, weak_king, [sq + 8])]
+                        if value:
+                            buckets[value].append(i)
+
+        for ply, bucket in enumerate(buckets):
+            for i in bucket:
+                if values[i]:
+                    continue
+                values[i] = ply + 1
+                side, king, weak_king, squares = self.decode(i)
+                occupied = SQUARE_MASK[king] | SQUARE_MASK[weak_king]
+                for sq in squares:
+                    occupied |= SQUARE_MASK[sq]
+                if side == WEAK:
+                    for j in self.strong_predecessors(king, weak_king, squares, occupied):
+                        if not values[j]:
+                            buckets[ply + 1].append(j)
+                else:
+                    for j in self.weak_predecessors(king, weak_king, squares, occupied):
+                        k = j - self.half
+                        if not values[j] and counts[k]:
+                            counts[k] -= 1
+                            if not counts[k]:
+                                buckets[ply + 1].append(j)
+            buckets[ply] = None
+            if log is not None and bucket:
+                log("ply {:3} positions {}".format(ply, len(bucket)))
+        return values
+
+
+def generate(names=None, log=None):
+    """
+    Generate tables by name, tables needed for pawn promotions are generated as well.
+    :return: OrderedDict mapping names to bytearrays
+    """
+    names = list(TABLES) if names is None else names
+    if 'KPK' in names:
+        names = [name for name, _ in PROMOTION_TABLES if name not in names] + names
+    result = OrderedDict()
+    for name in names:
+        start = time.perf_counter()
+        table = _Table(TABLES[name])
+        promotions = None
+        if PAWN in TABLES[name]:
+            promotions = [(_Table(TABLES[n]), result[n], piece) for n, piece in PROMOTION_TABLES]
+        result[name] = table.generate(promotions, log)
+        if log is not None:
+            log("{} {} positions in {:.1f}s".format(name, table.size, time.perf_counter() - start))
+    return result
+
+
+def write(path, tables):
+    """
+    write tables (name -> bytearray) into one indexed file
+    """
+    offset = HEADER.size + INDEX_ENTRY.size * len(tables)
+    with open(path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, len(tables)))
+        for name, values in tables.items():
+            f.write(INDEX_ENTRY.pack(name.encode('ascii'), offset, len(values)))
+            offset += len(values)
+        for values in tables.values():
+            f.write(values)
+
+
+class EndgameTables(object):
+    """
+    Memory-mapped endgame tables, probe() answers in constant time.
+    """
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, count = HEADER.unpack_from(self.data, 0)
+        if magic != MAGIC:
+            raise ValueError("not an endgame table file: {}".format(path))
+        self.tables = {}
+        for n in range(count):
+            name, offset, length = INDEX_ENTRY.unpack_from(self.data, HEADER.size + n * INDEX_ENTRY.size)
+            name = name.rstrip(b'\0').decode('ascii')
+            table = _Table(TABLES[name])
+            if length != table.size:
+                raise ValueError("table {} has {} entries instead of {}".format(name, length, table.size))
+            self.tables[name] = (table, offset)
+        self.max_pieces = max(len(table.pieces) + 2 for table, _ in self.tables.values()) if self.tables else 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self.data.close()
+
+    def probe(self, board):
+        """
+        Look up a position.
+        :return: EndgameProbe(wdl, dtm) for the side to move, wdl is 1 (win), 0 (draw) or -1 (loss) and
+                 dtm the plies to mate (None for a draw); None if no table covers the position
+        """
+        if (board.white_king_side_castle_right or board.white_queen_side_castle_right or
+                board.black_king_side_castle_right or board.black_queen_side_castle_right):
+            return None
+        pieces = board.pieces
+        for strong in (WHITE, BLACK):
+            us, them = (6, 0) if strong else (0, 6)
+            if pieces[them + QUEEN] | pieces[them + ROOK] | pieces[them + BISHOP] | pieces[them + KNIGHT] | \
+                    pieces[them + PAWN]:
+                continue
+            name, squares = 'K', []
+            for piece in NAME_ORDER:
+                for sq in _scan_lsb_first(pieces[us + piece]):
+                    name += SAN_SYMBOLS[piece] or 'P'
+                    squares.append(sq)
+            entry = self.tables.get(name + 'K')
+            if entry is None or not pieces[us + KING] or not pieces[them + KING]:
+                return None
+            table, offset = entry
+            king, weak_king = _lsb(pieces[us + KING]), _lsb(pieces[them + KING])
+            if strong == BLACK:
+                king, weak_king, squares = king ^ 56, weak_king ^ 56, [sq ^ 56 for sq in squares]
+            side = STRONG if board.active_player == strong else WEAK
+            value = self.data[offset + table.index(side, king, weak_king, squares)]
+            if not value:
+                return EndgameProbe(0, None)
+            return EndgameProbe(1 if side == STRONG else -1, value - 1)
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python endgame.py", description="generate endgame tables")
+    parser.add_argument("path", help="output file")
+    parser.add_argument("--tables", nargs="+", choices=list(TABLES), default=list(TABLES),
+                        help="tables to generate (default: all)")
+    args = parser.parse_args(argv)
+    write(args.path, generate(args.tables, log=print))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,114 @@
+"""
+Batch encoding of positions into NumPy feature planes
+
+Every position becomes 12 planes of 8x8 uint8 (one per bitboard of a Board, in PIECE_SYMBOL
+order) plus a row of META_FEATURES. Plane rows run from rank 8 to rank 1 and columns from the
+A-file to the H-file, the same orientation as a FEN.
+
+NumPy is required for this module only.
+"""
+
+import numpy as np
+
+from chess import Board
+
+PLANES = 12
+META_FEATURES = ['white_to_move',
+                 'white_king_side_castle_right', 'white_queen_side_castle_right',
+                 'black_king_side_castle_right', 'black_queen_side_castle_right',
+                 'ep_a', 'ep_b', 'ep_c', 'ep_d', 'ep_e', 'ep_f', 'ep_g', 'ep_h']
+
+CHUNK_SIZE = 4096
+
+
+def allocate(n, path=None):
+    """
+    Allocate the output arrays for n positions.
+    If a path prefix is given they are memory-mapped .npy files (<path>.planes.npy and
+    <path>.meta.npy), so datasets larger than RAM can be written.
+    """
+    if path is None:
+        return (np.zeros((n, PLANES, 8, 8), dtype=np.uint8),
+                np.zeros((n, len(META_FEATURES)), dtype=np.uint8))
+    return (np.lib.format.open_memmap(path + '.planes.npy', mode='w+', dtype=np.uint8, shape=(n, PLANES, 8, 8)),
+            np.lib.format.open_memmap(path + '.meta.npy', mode='w+', dtype=np.uint8,
+                                      shape=(n, len(META_FEATURES))))
+
+
+def _unpack(bitboards):
+    """
+    turn a (n, 12) uint64 array of bitboards into (n, 12, 8, 8) uint8 planes
+    """
+    # big endian bytes put square 63 (A8) first, which is the top left field of a plane
+    raw = bitboards.astype('>u8').view(np.uint8)
+    return np.unpackbits(raw, axis=-1).reshape(len(bitboards), PLANES, 8, 8)
+
+
+def encode(positions, planes=None, meta=None, chunk_size=CHUNK_SIZE):
+    """
+    Encode positions into feature planes.
+    The bitboards of up to chunk_size positions are gathered into one uint64 array and unpacked
+    with a single vectorized call, so no Python loop runs over squares.
+    :param positions: iterable of Boards or FEN strings, e.g. an open FEN file
+    :param planes: preallocated (n, 12, 8, 8) uint8 output, may be memory-mapped
+    :param meta: preallocated (n, len(META_FEATURES)) uint8 output
+    :param chunk_size: number of positions unpacked at once
+    :return: planes, meta and the number of positions written
+    """
+    if planes is None:
+        positions = list(positions)
+        planes, meta = allocate(len(positions))
+    elif meta is None:
+        meta = np.zeros((len(planes), len(META_FEATURES)), dtype=np.uint8)
+    if len(planes) != len(meta):
+        raise ValueError("planes and meta must have the same length")
+
+    capacity = len(planes)
+    bitboards = np.zeros((chunk_size, PLANES), dtype=np.uint64)
+    rows = np.zeros((chunk_size, len(META_FEATURES)), dtype=np.uint8)
+    written = filled = 0
+
+    def flush():
+        planes[written:written + filled] = _unpack(bitboards[:filled])
+        meta[written:written + filled] = rows[:filled]
+
+    for position in positions:
+        if written + filled == capacity:
+            raise ValueError("more positions than the output arrays can hold")
+        board = Board(position) if isinstance(position, str) else position
+
+        bitboards[filled] = board.pieces
+        row = rows[filled]
+        row[:] = 0
+        row[0] = board.active_player
+        row[1] = board.white_king_side_castle_right
+        row[2] = board.white_queen_side_castle_right
+        row[3] = board.black_king_side_castle_right
+        row[4] = board.black_queen_side_castle_right
+        if board.ep_square is not None:
+            row[5 + 7 - (board.ep_square & 7)] = 1
+        filled += 1
+
+        if filled == chunk_size:
+            flush()
+            written, filled = written + filled, 0
+
+    if filled:
+        flush()
+        written += filled
+    return planes, meta, written
+
+
+def encode_fens(lines, planes, meta, epd=False, chunk_size=CHUNK_SIZE):
+    """
+    Stream a FEN or EPD file (any iterable of lines) into preallocated output arrays.
+    """
+    return encode(Board.from_fens(lines, epd=epd), planes, meta, chunk_size)
+
+
+def decode(planes):
+    """
+    Pack planes back into bitboards, returns a (n, 12) uint64 array.
+    """
+    packed = np.packbits(np.asarray(planes, dtype=np.uint8).reshape(len(planes), PLANES, 64), axis=-1)
+    return packed.view('>u8').reshape(len(planes), PLANES).astype(np.uint64)
@@ -0,0 +1,103 @@
+"""
+Spread perft and position analysis over a pool of worker processes
+
+Jobs only carry FEN strings and integers, never Board objects, so sending them to a worker is
+cheap. Results are merged in input order (root moves in generation order, positions in file
+order), so the output does not depend on the number of workers or on scheduling.
+"""
+
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from chess import Board, Move, TranspositionTable, divide, perft
+
+CHUNK_SIZE = 64
+
+# per process state, set up once by _init_worker
+_tt = None
+
+
+def _init_worker(hash_mb):
+    global _tt
+    _tt = TranspositionTable(hash_mb) if hash_mb else None
+
+
+def _perft_job(job):
+    fen, code, depth = job
+    board = Board(fen)
+    board.push(Move.from_code(code))
+    return perft(board, depth - 1, _tt)
+
+
+def _analyze_job(job):
+    function, lines, epd = job
+    return [function(board) for board in Board.from_fens(lines, epd=epd)]
+
+
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def parallel_divide(board, depth, workers=None, hash_mb=0):
+    """
+    Perft split up by root move, every root move is searched in a worker process.
+    :param board: Board or FEN string
+    :param depth: number of plies
+    :param workers: number of processes (default: os.cpu_count())
+    :param hash_mb: size of the transposition table of each worker in MB (default: off)
+    :return: dict mapping every legal move to its node count, in move generation order
+    :raises ValueError: for a depth below 1, like divide()
+    """
+    if isinstance(board, str):
+        board = Board(board)
+    if depth <= 1:
+        return divide(board, depth)
+
+    fen = board.to_fen()
+    moves = list(board.gen_legal_moves())
+    with ProcessPoolExecutor(workers or os.cpu_count(), initializer=_init_worker, initargs=(hash_mb,)) as pool:
+        counts = pool.map(_perft_job, [(fen, int(move), depth) for move in moves])
+        return dict(zip(moves, counts))
+
+
+def parallel_perft(board, depth, workers=None, hash_mb=0):
+    """
+    Same result as perft(), computed with parallel_divide.
+    """
+    if depth <= 0:
+        return 1
+    return sum(parallel_divide(board, depth, workers, hash_mb).values())
+
+
+def analyze_iter(lines, function, workers=None, chunk_size=CHUNK_SIZE, epd=False):
+    """
+    Apply function to every position of a FEN or EPD file in worker processes, yielding the
+    results in the order of the input as they become available.
+    Lines are read lazily and sent to the workers in chunks of chunk_size, at most two chunks per
+    worker are in flight, so files of any size are processed in constant memory.
+    :param lines: iterable of FEN lines, blank lines and '#' comments are skipped
+    :param function: module level function taking a Board, its results must be picklable
+    """
+    workers = workers or os.cpu_count()
+    pending = deque()
+    with ProcessPoolExecutor(workers) as pool:
+        for chunk in _chunks(lines, chunk_size):
+            if len(pending) >= 2 * workers:
+                yield from pending.popleft().result()
+            pending.append(pool.submit(_analyze_job, (function, chunk, epd)))
+        while pending:
+            yield from pending.popleft().result()
+
+
+def analyze(lines, function, workers=None, chunk_size=CHUNK_SIZE, epd=False):
+    """
+    Same as analyze_iter, but returns the results as one list.
+    """
+    return list(analyze_iter(lines, function, workers, chunk_size, epd))
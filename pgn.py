@@ -0,0 +1,219 @@
+"""
+Streaming PGN reader and writer
+
+read_games yields one Game at a time from a PGN file (gzip compressed if the name ends with .gz)
+or any iterable of lines, so archives far larger than memory can be processed. Movetext is
+converted from SAN with Board.parse_san, comments, NAGs and variations are skipped.
+write_games is the reverse direction.
+"""
+
+import gzip
+import re
+from collections import OrderedDict
+
+from chess import Board, BASEBOARD
+
+SEVEN_TAG_ROSTER = ['Event', 'Site', 'Date', 'Round', 'White', 'Black', 'Result']
+RESULTS = ['1-0', '0-1', '1/2-1/2', '*']
+LINE_LENGTH = 80
+
+HEADER = re.compile(r'\[\s*(\w+)\s+"((?:[^"\\]|\\.)*)"\s*\]')
+TOKEN = re.compile(r'\{[^}]*\}?|;[^\n]*|\$\d+|[()]|1-0|0-1|1/2-1/2|\*|\d+\.+|[^\s(){};$]+')
+
+
+class Game(object):
+    """
+    A game: its PGN headers and its moves from the start position (or the FEN header).
+    """
+
+    def __init__(self, headers=None, moves=None):
+        self.headers = OrderedDict((tag, '?') for tag in SEVEN_TAG_ROSTER)
+        self.headers['Result'] = '*'
+        self.headers.update(headers or {})
+        self.moves = [] if moves is None else moves
+
+    def __repr__(self):
+        return '<Game {} - {} {}>'.format(self.headers['White'], self.headers['Black'], self.result)
+
+    @property
+    def result(self):
+        return self.headers['Result']
+
+    @classmethod
+    def from_board(cls, board, headers=None):
+        """
+        the game that led to the position of the board, as far as its move stack reaches
+        """
+        board = board.copy()
+        moves = []
+        while board.move_stack:
+            moves.append(board.pop())
+        headers = OrderedDict(headers or {})
+        fen = board.to_fen()
+        if fen != BASEBOARD:
+            headers.setdefault('SetUp', '1')
+            headers.setdefault('FEN', fen)
+        return cls(headers, moves[::-1])
+
+    def start(self):
+        """
+        new board with the starting position of the game
+        """
+        return Board(self.headers.get('FEN'))
+
+    def board(self):
+        """
+        new board with all moves of the game played
+        """
+        board = self.start()
+        for move in self.moves:
+            board.push(move)
+        return board
+
+    def to_pgn(self):
+        """
+        the game as PGN text, moves in SAN and wrapped at LINE_LENGTH columns
+        """
+        lines = ['[{} "{}"]'.format(tag, value.replace('\\', '\\\\').replace('"', '\\"'))
+                 for tag, value in self.headers.items()]
+        lines.append('')
+
+        board = self.start()
+        tokens = []
+        for move in self.moves:
+            if board.active_player:
+                tokens.append('{}.'.format(board.move_number))
+            elif not tokens:
+                tokens.append('{}...'.format(board.move_number))
+            tokens.append(board.san(move))
+            board.push(move)
+        tokens.append(self.result)
+
+        line = ''
+        for token in tokens:
+            if line and len(line) + 1 + len(token) > LINE_LENGTH:
+                lines.append(line)
+                line = token
+            else:
+                line = line + ' ' + token if line else token
+        lines.append(line)
+        return '\n'.join(lines) + '\n'
+
+
+def _open(source, mode):
+    if source.endswith('.gz'):
+        return gzip.open(source, mode + 't', encoding='utf-8', errors='replace')
+    return open(source, mode, encoding='utf-8', errors='replace')
+
+
+def _lines(source):
+    if isinstance(source, str):
+        with _open(source, 'r') as f:
+            yield from f
+    else:
+        yield from source
+
+
+def parse_movetext(board, movetext):
+    """
+    Play the SAN moves of a movetext on the board.
+    :return: the moves and the result token (None if missing)
+    """
+    moves, result, depth = [], None, 0
+    for token in TOKEN.findall(movetext):
+        first = token[0]
+        if first == '(':
+            depth += 1
+        elif first == ')':
+            depth -= 1
+        elif depth or first in '{;$' or first.isdigit() and token[-1] == '.':
+            continue
+        elif token in RESULTS:
+            result = token
+        else:
+            move = board.parse_san(token)
+            board.push(move)
+            moves.append(move)
+    return moves, result
+
+
+def _comment_open(line, comment):
+    """
+    whether a {...} comment is still open after the line, comment tells if one was open before it
+    """
+    for char in line:
+        if comment:
+            comment = char != '}'
+        elif char == '{':
+            comment = True
+        elif char == ';':
+            break
+    return comment
+
+
+def read_games(source, moves=True, skip_errors=False):
+    """
+    Lazily read the games of a PGN file.
+    :param source: file name (.gz files are decompressed on the fly) or an iterable of lines
+    :param moves: parse the movetext, if False games only carry their headers
+    :param skip_errors: leave out games with illegal moves instead of raising ValueError
+    """
+    headers, movetext, comment, blank = OrderedDict(), [], False, False
+    for line in _lines(source):
+        line = line.strip()
+        if comment:
+            # a {...} comment spanning lines, brackets in it do not start a new game
+            movetext.append(line)
+            comment = _comment_open(line, comment)
+            continue
+        if line.startswith('[') and (movetext or blank):
+            # movetext or a blank line after the tags ends the previous game, even one without moves
+            game = _game(headers, movetext, moves, skip_errors)
+            if game is not None:
+                yield game
+            headers, movetext, blank = OrderedDict(), [], False
+        if not line and headers:
+            blank = True
+        if line.startswith('['):
+            match = HEADER.match(line)
+            if match:
+                headers[match.group(1)] = match.group(2).replace('\\"', '"').replace('\\\\', '\\')
+        elif line and line[0] != '%':
+            movetext.append(line)
+            comment = _comment_open(line, comment)
+    if headers or movetext:
+        game = _game(headers, movetext, moves, skip_errors)
+        if game is not None:
+            yield game
+
+
+def _game(headers, movetext, moves, skip_errors):
+    game = Game(headers)
+    if not moves:
+        return game
+    try:
+        game.moves, result = parse_movetext(game.start(), '\n'.join(movetext))
+    except ValueError as e:
+        if skip_errors:
+            return None
+        raise ValueError("{} in game {}".format(e, game))
+    if result is not None and 'Result' not in headers:
+        game.headers['Result'] = result
+    return game
+
+
+def write_games(games, target):
+    """
+    Write games as PGN, separated by blank lines.
+    :param target: file name (compressed if it ends with .gz) or a file object
+    """
+    if isinstance(target, str):
+        with _open(target, 'w') as f:
+            return write_games(games, f)
+    count = 0
+    for game in games:
+        if count:
+            target.write('\n')
+        target.write(game.to_pgn())
+        count += 1
+    return count
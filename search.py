@@ -0,0 +1,329 @@
+"""
+Alpha-beta search
+
+Negamax with alpha-beta pruning and a transposition table, driven by iterative deepening with
+aspiration windows. Leaves are resolved by a quiescence search over the captures that do not lose
+material by static exchange evaluation and queen promotions.
+
+Moves are picked in stages: hash move, winning captures by MVV-LVA, killer moves, quiet moves by
+their history score and losing captures. A stage is only generated once the ones before it are used
+up, so a cutoff on an early move never generates the quiet moves.
+
+Repetitions and the fifty-move rule count as draws, positions covered by endgame tables are scored
+from the tables.
+
+A search ends when the depth limit, the node limit or the deadline is reached or when stop() is
+called from another thread. The best move of the last finished iteration is returned.
+"""
+
+import time
+from collections import namedtuple
+from itertools import chain
+
+from chess import QUEEN, PAWN, SQUARE_MASK, UNIVERSE, EXACT, LOWER_BOUND, UPPER_BOUND, Move, TranspositionTable
+
+INFINITY = 1000000
+MATE = 100000
+MAX_PLY = 128
+
+PIECE_VALUES = [0, 900, 320, 330, 500, 100]  # indexed by piece type, for move ordering
+
+ASPIRATION_WINDOW = 50
+CHECK_INTERVAL = 1024  # nodes between two looks at the clock
+
+HISTORY_LIMIT = 1 << 22  # history scores saturate here
+
+SearchInfo = namedtuple('SearchInfo', ['depth', 'score', 'nodes', 'time', 'nps', 'pv'])
+
+
+def _score_to_tt(score, ply):
+    # mate scores are stored relative to the position, not to the root
+    if score > MATE - MAX_PLY:
+        return score + ply
+    if score < -MATE + MAX_PLY:
+        return score - ply
+    return score
+
+
+def _score_from_tt(score, ply):
+    if score > MATE - MAX_PLY:
+        return score - ply
+    if score < -MATE + MAX_PLY:
+        return score + ply
+    return score
+
+
+class _Abort(Exception):
+    pass
+
+
+class Search(object):
+    """
+    Searcher keeping its transposition table, killer moves and history scores between searches.
+    """
+
+    def __init__(self, tt=None, tablebases=None):
+        """
+        :param tt: transposition table, a new one of the default size if None
+        :param tablebases: optional endgame.EndgameTables, positions they cover are not searched
+        """
+        self.tt = TranspositionTable() if tt is None else tt
+        self.tablebases = tablebases
+        self.killers = [[0, 0] for _ in range(MAX_PLY + 1)]
+        self.history = [[0] * 4096, [0] * 4096]  # per color, indexed by from | to << 6
+        self.nodes = 0
+        self.stopped = False
+        self.max_nodes = None
+        self.deadline = None
+        self._next_check = 0
+        self._root_move = None
+
+    def stop(self):
+        """
+        end a running search as soon as possible, safe to call from another thread
+        """
+        self.stopped = True
+
+    def search(self, board, depth=MAX_PLY, nodes=None, movetime=None, deadline=None, info=None):
+        """
+        Search the position with iterative deepening.
+        :param board: position to search, it is restored when done
+        :param depth: maximum depth in plies
+        :param nodes: stop after about this many nodes
+        :param movetime: stop after this many seconds
+        :param deadline: stop at this time.perf_counter() value
+        :param info: optional callback receiving a SearchInfo after every finished iteration
+        :return: best move (None if there is no legal move) and the SearchInfo of the last iteration
+        """
+        start = time.perf_counter()
+        if movetime is not None:
+            deadline = start + movetime if deadline is None else min(deadline, start + movetime)
+        self.nodes, self.stopped = 0, False
+        self.max_nodes, self.deadline = nodes, deadline
+        self._next_check = CHECK_INTERVAL if nodes is None else min(nodes, CHECK_INTERVAL)
+        self.tt.new_search()
+        for ply in self.killers:
+            ply[0] = ply[1] = 0
+        for history in self.history:
+            history[:] = [h >> 1 for h in history]
+
+        moves = list(board.gen_legal_moves())
+        if not moves:
+            return None, SearchInfo(0, -MATE if board.is_check() else 0, 0, 0.0, 0, [])
+
+        best_move, score = moves[0], 0
+        last = SearchInfo(0, 0, 0, 0.0, 0, [best_move])
+        stack_size = len(board.move_stack)
+        for d in range(1, depth + 1):
+            self._root_move = None
+            try:
+                score = self._aspiration(board, d, score)
+            except _Abort:
+                while len(board.move_stack) > stack_size:
+                    board.pop()
+                # a root move that raised alpha in the unfinished iteration is still an improvement
+                if self._root_move is not None:
+                    best_move = self._root_move
+                    last = last._replace(pv=[best_move])
+                break
+            best_move = self._root_move
+            elapsed = time.perf_counter() - start
+            last = SearchInfo(d, score, self.nodes, elapsed, int(self.nodes / elapsed) if elapsed else 0,
+                              self._pv(board, best_move, d))
+            if info is not None:
+                info(last)
+            if abs(score) > MATE - MAX_PLY and MATE - abs(score) <= d:
+                break
+
+        elapsed = time.perf_counter() - start
+        return best_move, last._replace(nodes=self.nodes, time=elapsed,
+                                        nps=int(self.nodes / elapsed) if elapsed else 0)
+
+    def _aspiration(self, board, depth, guess):
+        if depth < 3 or abs(guess) > MATE - MAX_PLY:
+            return self._negamax(board, depth, -INFINITY, INFINITY, 0)
+        delta = ASPIRATION_WINDOW
+        alpha, beta = guess - delta, guess + delta
+        while True:
+            score = self._negamax(board, depth, alpha, beta, 0)
+            if score <= alpha:
+                alpha = max(score - delta, -INFINITY)
+            elif score >= beta:
+                beta = min(score + delta, INFINITY)
+            else:
+                return score
+            delta *= 2
+
+    def _check_limits(self):
+        if self.stopped:
+            raise _Abort()
+        if self.max_nodes is not None and self.nodes >= self.max_nodes:
+            raise _Abort()
+        if self.deadline is not None and time.perf_counter() >= self.deadline:
+            raise _Abort()
+        self._next_check = self.nodes + CHECK_INTERVAL
+        if self.max_nodes is not None:
+            self._next_check = min(self._next_check, self.max_nodes)
+
+    def _negamax(self, board, depth, alpha, beta, ply):
+        if depth <= 0 or ply >= MAX_PLY:
+            return self._quiesce(board, alpha, beta, ply)
+        self.nodes += 1
+        if self.nodes >= self._next_check:
+            self._check_limits()
+
+        # a repetition inside the search is scored as a draw, the side to move can repeat again
+        if ply and board.is_repetition(2):
+            return 0
+        if ply and self.tablebases is not None and \
+                bin(board.occupied).count('1') <= self.tablebases.max_pieces:
+            probe = self.tablebases.probe(board)
+            if probe is not None:
+                if not probe.wdl:
+                    return 0
+                return MATE - ply - probe.dtm if probe.wdl > 0 else -MATE + ply + probe.dtm
+
+        key = board.zobrist
+        hash_move = None
+        entry = self.tt.probe(key)
+        if entry is not None:
+            hash_move = entry[3]
+            if ply and entry[0] >= depth:
+                score, bound = _score_from_tt(entry[2], ply), entry[1]
+                if (bound == EXACT or (bound == LOWER_BOUND and score >= beta) or
+                        (bound == UPPER_BOUND and score <= alpha)):
+                    return score
+
+        if ply and board.is_fifty_moves() and board.has_legal_moves():
+            return 0
+
+        original_alpha = alpha
+        best, best_move = -INFINITY, None
+        squares = board.squares
+        for move in self._moves(board, hash_move, ply):
+            board.push(move)
+            score = -self._negamax(board, depth - 1, -beta, -alpha, ply + 1)
+            board.pop()
+            if score > best:
+                best, best_move = score, move
+                if score > alpha:
+                    alpha = score
+                    if not ply:
+                        self._root_move = move
+                    if score >= beta:
+                        if squares[move >> 6 & 0x3f] is None and not move >> 12:
+                            self._quiet_cutoff(board.active_player, move, depth, ply)
+                        break
+        if best_move is None:
+            return -MATE + ply if board.is_check() else 0
+
+        bound = UPPER_BOUND if best <= original_alpha else LOWER_BOUND if best >= beta else EXACT
+        self.tt.store(key, depth, bound, _score_to_tt(best, ply), best_move)
+        return best
+
+    def _quiesce(self, board, alpha, beta, ply):
+        self.nodes += 1
+        if self.nodes >= self._next_check:
+            self._check_limits()
+
+        stand_pat = board.evaluate()
+        if stand_pat >= beta or ply >= MAX_PLY:
+            return stand_pat
+        if stand_pat > alpha:
+            alpha = stand_pat
+
+        for move in self._moves(board, None, ply, quiets=False):
+            board.push(move)
+            score = -self._quiesce(board, -beta, -alpha, ply + 1)
+            board.pop()
+            if score >= beta:
+                return score
+            if score > alpha:
+                alpha = score
+        return alpha
+
+    def _moves(self, board, hash_move, ply, quiets=True):
+        """
+        Legal moves in stages, every stage is generated only when the one before is used up:
+        the hash move, winning captures and queen promotions by MVV-LVA, the killer moves, quiet
+        moves by history score and last losing captures and under-promotions. Captures count as
+        losing if their static exchange evaluation is negative.
+        :param quiets: False keeps only the winning captures and queen promotions, for the quiescence search
+        """
+        player = board.active_player
+        squares = board.squares
+        ep_square = board.ep_square
+        quiet_targets = ~board.occupancy[not player] & UNIVERSE
+        if ep_square is not None:
+            quiet_targets &= ~SQUARE_MASK[ep_square]
+
+        if hash_move is not None:
+            # a hash move can come from a colliding key, it is checked against the moves onto its square
+            if hash_move in board.gen_legal_moves(SQUARE_MASK[hash_move >> 6 & 0x3f]):
+                yield hash_move
+            else:
+                hash_move = None
+
+        good, bad = [], []
+        for move in chain(board.gen_captures(), board.gen_promotions()):
+            if move == hash_move:
+                continue
+            promotion, victim = move >> 12, squares[move >> 6 & 0x3f]
+            value = PIECE_VALUES[victim % 6] if victim is not None else PIECE_VALUES[PAWN]
+            if promotion:
+                if victim is None:
+                    value = 0
+                (good if promotion == QUEEN else bad).append((value + PIECE_VALUES[promotion], move))
+            else:
+                exchange = board.see(move)
+                if exchange >= 0:
+                    good.append((value * 16 - PIECE_VALUES[squares[move & 0x3f] % 6] // 16, move))
+                elif quiets:
+                    bad.append((exchange, move))
+        good.sort(reverse=True)
+        for _, move in good:
+            yield move
+        if not quiets:
+            return
+
+        killers = []
+        for killer in self.killers[ply]:
+            to = SQUARE_MASK[killer >> 6 & 0x3f] & quiet_targets
+            if killer and killer != hash_move and to and killer in board.gen_legal_moves(to):
+                killers.append(killer)
+                yield Move.from_code(killer)
+
+        history = self.history[player]
+        moves = [move for move in board.gen_legal_moves(quiet_targets)
+                 if not move >> 12 and move != hash_move and move not in killers]
+        if ep_square is not None:
+            # quiet moves onto the ep square, the pawn captures there are in the capture stages
+            moves.extend(move for move in board.gen_legal_moves(SQUARE_MASK[ep_square])
+                         if squares[move & 0x3f] % 6 != PAWN and move != hash_move and move not in killers)
+        moves.sort(key=lambda move: history[move & 0xfff], reverse=True)
+        yield from moves
+
+        bad.sort(reverse=True)
+        for _, move in bad:
+            yield move
+
+    def _quiet_cutoff(self, player, move, depth, ply):
+        killers = self.killers[ply]
+        if killers[0] != move:
+            killers[1], killers[0] = killers[0], int(move)
+        history = self.history[player]
+        history[move & 0xfff] = min(history[move & 0xfff] + depth * depth, HISTORY_LIMIT)
+
+    def _pv(self, board, move, depth):
+        """
+        principal variation from the transposition table, starting with the root move
+        """
+        pv = []
+        while move is not None and len(pv) < depth and move in board.gen_legal_moves():
+            pv.append(move)
+            board.push(move)
+            entry = self.tt.probe(board.zobrist)
+            move = entry[3] if entry is not None else None
+        for _ in pv:
+            board.pop()
+        return pv
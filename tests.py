@@ -61,6 +61,23 @@ class SetBit(BaseTest):
         assert (_set_bit(7, 0, 0) == 6)
 
 
+class TestAttackTables(BaseTest):
+    def __init__(self):
+        super(TestAttackTables, self).__init__(name="Test precomputed leaper attack tables")
+
+    def run(self):
+        from chess import KING_ATTACKS, KNIGHT_ATTACKS, PAWN_ATTACKS, SQUARE_MASK, H1, A1, D4, A8, H8
+
+        assert KING_ATTACKS[H1] == 0x302
+        assert KING_ATTACKS[A8] == 0x40c0000000000000
+        assert KNIGHT_ATTACKS[H1] == 0x20400
+        assert KNIGHT_ATTACKS[D4] == 44272527353856
+        assert bin(KNIGHT_ATTACKS[A1]).count('1') == 2
+        assert PAWN_ATTACKS[1][H1] == SQUARE_MASK[H1 + 9]
+        assert PAWN_ATTACKS[0][H8] == SQUARE_MASK[H8 - 7]
+        assert PAWN_ATTACKS[1][H8] == 0
+
+
 class TestFENNotation(BaseTest):
     def __init__(self):
         super(TestFENNotation, self).__init__(name="Test FEN Notation.")
@@ -124,6 +141,57 @@ class TestFENNotation(BaseTest):
         assert b.to_fen() == test_fen
 
 
+class TestFENCodec(BaseTest):
+    def __init__(self):
+        super(TestFENCodec, self).__init__(name="Test FEN validation and bulk helpers")
+
+    def run(self):
+        import io
+        from chess import Board, Move, PERFT_POSITIONS, SQ_NUM
+
+        for bad in ("rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNX w KQkq - 0 1",
+                    "rnbqkbnr/pppppppp/9/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1",
+                    "rnbqkbnr/ppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1",
+                    "rnbqkbnr/pppppppp/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1",
+                    "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR x KQkq - 0 1",
+                    "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkx - 0 1",
+                    "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq e4 0 1",
+                    # the ep square is on the wrong rank for the side to move
+                    "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq e3 0 1",
+                    "rnbqkbnr/pppp1ppp/8/4p3/8/8/PPPPPPPP/RNBQKBNR w KQkq e3 0 1",
+                    # no pawn in front of the ep square
+                    "4k3/8/8/3Pn3/8/8/8/4K3 w - e6 0 1",
+                    "4k3/4p3/8/3Pp3/8/8/8/4K3 w - e6 0 1",
+                    "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - -1 1",
+                    "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq -"):
+            b = Board()
+            try:
+                b.from_fen(bad)
+                assert False, bad
+            except ValueError:
+                pass
+            assert b.to_fen() == Board().to_fen()
+
+        fens = [fen for _, fen, _ in PERFT_POSITIONS]
+        stream = io.StringIO('\n'.join(["# reference positions", ""] + fens) + '\n')
+        boards = list(Board.from_fens(stream))
+        assert list(Board.to_fens(boards)) == fens
+        assert Board("r3k2r/8/8/8/8/8/8/R3K2R w kqKQ - 0 1").to_fen() == "r3k2r/8/8/8/8/8/8/R3K2R w KQkq - 0 1"
+        assert Board("4k3/8/8/3pP3/8/8/8/4K3 w - d6 0 1").ep_square == SQ_NUM['d6']
+        assert Board("4k3/8/8/8/3Pp3/8/8/4K3 b - d3 0 1").ep_square == SQ_NUM['d3']
+
+        # castling rights without the king or the rook on its square are dropped
+        b = Board("4k3/8/8/8/8/8/8/4K3 w K - 0 1")
+        assert b.to_fen() == "4k3/8/8/8/8/8/8/4K3 w - - 0 1"
+        assert Move.from_uci("e1g1") not in b.gen_legal_moves()
+        assert Board("r3k2r/8/8/8/8/8/8/R4K1R w KQkq - 0 1").to_fen() == "r3k2r/8/8/8/8/8/8/R4K1R w kq - 0 1"
+        assert Board("1r2k1r1/8/8/8/8/8/8/R3K2R b KQkq - 0 1").to_fen() == "1r2k1r1/8/8/8/8/8/8/R3K2R b KQ - 0 1"
+
+        epd = ["r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - bm e2a6; id \"kiwipete\";"]
+        b, = Board.from_fens(epd, epd=True)
+        assert b.to_fen() == fens[1]
+
+
 class TestKingAttacks(BaseTest):
     def __init__(self):
         super(TestKingAttacks, self).__init__(name="Test attacked fields by king")
@@ -174,6 +242,29 @@ class TestKnightAttacks(BaseTest):
         assert b.attacked_fields(1) == 44272527353856
 
 
+class TestSlidingAttacks(BaseTest):
+    def __init__(self):
+        super(TestSlidingAttacks, self).__init__(name="Test sliding attack lookup")
+
+    def run(self):
+        import random
+        from chess import Board, _rook_attacks, _bishop_attacks, _queen_attacks, _slide, STEPS, SLIDES, DIRECTIONS
+
+        rnd = random.Random(42)
+        for _ in range(500):
+            sq, occupied = rnd.randrange(64), rnd.getrandbits(64) & rnd.getrandbits(64)
+            assert _rook_attacks(sq, occupied) == _slide(sq, STEPS, occupied)
+            assert _bishop_attacks(sq, occupied) == _slide(sq, SLIDES, occupied)
+            assert _queen_attacks(sq, occupied) == _slide(sq, DIRECTIONS, occupied)
+
+        # own and hostile blockers both stop the rook, only the hostile one can be taken
+        b = Board("8/8/8/3p4/8/8/3R1P2/8 w - - 0 1")
+        targets = sorted(m.uci for m in b.gen_pseudo_legal_moves() if m.from_square == 12)
+        assert targets == ['d2a2', 'd2b2', 'd2c2', 'd2d1', 'd2d3', 'd2d4', 'd2d5', 'd2e2']
+        # a defended piece is attacked as well
+        assert b.attacked_fields(1) & (1 << 10)
+
+
 class TestPawnAttacks(BaseTest):
     def __init__(self):
         super(TestPawnAttacks, self).__init__(name="Test attacked fields by Pawns")
@@ -198,14 +289,16 @@ class TestMoves(BaseTest):
         assert len(list(b.gen_pseudo_legal_moves())) == 20
         b.make_move(Move.from_uci("e2e4"))
         assert b.move_number == 1
-        assert b.half_move_clock == 1
+        assert b.half_move_clock == 0
         assert not b.active_player
-        assert b.to_fen() == 'rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq e3 1 1'
+        assert b.to_fen() == 'rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq e3 0 1'
         assert len(list(b.gen_pseudo_legal_moves())) == 20
         b.make_move(Move.from_uci("d7d5"))
         assert b.move_number == 2
-        assert b.half_move_clock == 2
+        assert b.half_move_clock == 0
         assert b.active_player
+        b.make_move(Move.from_uci("g1f3"))
+        assert b.half_move_clock == 1
 
         # EN PASSANT
         b = Board("rnbqkbnr/ppp1p1pp/8/3pPp2/8/8/PPPP1PPP/RNBQKBNR w KQkq f6 0 3")
@@ -229,20 +322,920 @@ class TestMoves(BaseTest):
             assert b.to_fen() == "rnbq1rk1/p1p3pp/3bpP1n/1p1p4/8/BPN2Q2/P1PP1PPP/2KR1BNR b - - 1 8"
 
 
+class TestPerft(BaseTest):
+    def __init__(self):
+        super(TestPerft, self).__init__(name="Test perft against reference positions")
+
+    def run(self):
+        import contextlib
+        import io
+        from chess import Board, TranspositionTable, PERFT_POSITIONS, BASEBOARD, perft, divide, main
+
+        for name, fen, expected in PERFT_POSITIONS:
+            b = Board(fen)
+            for depth in (1, 2):
+                assert perft(b, depth) == expected[depth - 1], name
+            assert b.to_fen() == fen
+
+        b = Board(PERFT_POSITIONS[2][1])
+        assert perft(b, 3, TranspositionTable(1)) == PERFT_POSITIONS[2][2][2]
+
+        counts = divide(Board(), 2)
+        assert len(counts) == 20
+        assert all(nodes == 20 for nodes in counts.values())
+
+        # depths below 1 neither recurse forever nor split by root move
+        assert perft(Board(), 0) == perft(Board(), -1) == 1
+        for depth in (0, -1):
+            try:
+                divide(Board(), depth)
+                assert False
+            except ValueError:
+                pass
+        try:
+            with contextlib.redirect_stderr(io.StringIO()):
+                main(["perft", "--fen", BASEBOARD, "--depth", "0", "--divide"])
+            assert False
+        except SystemExit as e:
+            assert e.code == 2
+
+
+class TestLegalMoves(BaseTest):
+    def __init__(self):
+        super(TestLegalMoves, self).__init__(name="Test legal move generation")
+
+    def run(self):
+        from chess import Board, Move, PERFT_POSITIONS
+
+        def filtered(board):
+            player, moves = board.active_player, []
+            for m in list(board.gen_pseudo_legal_moves()):
+                board.push(m)
+                if not board.is_check(player):
+                    moves.append(m.uci)
+                board.pop()
+            return sorted(moves)
+
+        for name, fen, expected in PERFT_POSITIONS:
+            b = Board(fen)
+            for m in list(b.gen_legal_moves()):
+                b.push(m)
+                assert sorted(n.uci for n in b.gen_legal_moves()) == filtered(b), name
+                b.pop()
+
+        # ep capture would expose the king along the rank
+        b = Board("8/8/8/KPp4r/8/8/8/7k w - c6 0 1")
+        assert Move.from_uci("b5c6") not in b.gen_legal_moves()
+        assert Move.from_uci("b5b6") in b.gen_legal_moves()
+
+        # pinned bishop may only move along the pin, double check allows king moves only
+        b = Board("4k3/8/8/8/8/2b5/3B4/4K3 w - - 0 1")
+        assert sorted(m.uci for m in b.gen_legal_moves() if m.from_square == 12) == ['d2c3']
+        b = Board("4k3/8/8/8/1b6/8/5N2/r3K3 w - - 0 1")
+        assert sorted(m.uci for m in b.gen_legal_moves()) == ['e1e2']
+
+
+class TestFeaturePlanes(BaseTest):
+    def __init__(self):
+        super(TestFeaturePlanes, self).__init__(name="Test NumPy feature planes")
+
+    def run(self):
+        try:
+            import numpy as np
+        except ImportError:
+            print("SKIPPED : numpy is not installed")
+            return
+        import io
+        import features
+        from chess import Board, PIECE_INDEX, PERFT_POSITIONS
+
+        b = Board("rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq e3 0 1")
+        planes, meta, n = features.encode([b, Board()])
+        assert n == 2 and planes.shape == (2, 12, 8, 8) and planes.dtype == np.uint8
+        assert planes[0, PIECE_INDEX['P'], 4, 4] == 1 and planes[0, PIECE_INDEX['P'], 6, 4] == 0
+        assert planes[0, PIECE_INDEX['r'], 0].tolist() == [1, 0, 0, 0, 0, 0, 0, 1]
+        assert planes[1].sum() == 32
+        assert meta[0].tolist() == [0, 1, 1, 1, 1, 0, 0, 0, 0, 1, 0, 0, 0]
+        assert features.decode(planes)[0].tolist() == b.pieces
+
+        # streamed FENs in small chunks into preallocated arrays
+        fens = [fen for _, fen, _ in PERFT_POSITIONS]
+        planes, meta = features.allocate(len(fens))
+        assert features.encode_fens(io.StringIO('\n'.join(fens)), planes, meta, chunk_size=4)[2] == len(fens)
+        assert features.decode(planes).tolist() == [Board(fen).pieces for fen in fens]
+
+
+class TestBatchMoveGeneration(BaseTest):
+    def __init__(self):
+        super(TestBatchMoveGeneration, self).__init__(name="Test vectorized multi-board move generation")
+
+    def run(self):
+        try:
+            import numpy as np
+        except ImportError:
+            print("SKIPPED : numpy is not installed")
+            return
+        from batch import BoardBatch, popcount
+        from chess import Board, PERFT_POSITIONS, BLACK, WHITE
+
+        assert popcount(np.array([0, 1, 0xff, 2 ** 64 - 1], dtype=np.uint64)).tolist() == [0, 1, 8, 64]
+
+        boards = [Board(fen) for _, fen, _ in PERFT_POSITIONS]
+        # positions with ep squares, promotions and black to move
+        boards += [Board("rnbqkbnr/ppp1p1pp/8/3pPp2/8/8/PPPP1PPP/RNBQKBNR w KQkq f6 0 3"),
+                   Board("r3k2r/1P6/8/8/8/8/6p1/R3K2R b KQkq - 0 1"),
+                   Board("8/8/8/8/8/8/8/8 w - - 0 1")]
+        batch = BoardBatch.from_boards(boards)
+        assert len(batch) == len(boards)
+        assert batch.pseudo_legal_move_counts().tolist() == [len(list(b.gen_pseudo_legal_moves())) for b in boards]
+        for color in (BLACK, WHITE):
+            assert batch.attacks(color).tolist() == [b.attacked_fields(color) for b in boards]
+
+
+class TestParallel(BaseTest):
+    def __init__(self):
+        super(TestParallel, self).__init__(name="Test process pool perft and analysis")
+
+    def run(self):
+        from chess import Board, PERFT_POSITIONS, divide
+        from parallel import parallel_divide, parallel_perft, analyze, analyze_iter
+
+        name, fen, expected = PERFT_POSITIONS[1]
+        assert parallel_perft(fen, 3, workers=2) == expected[2]
+        assert parallel_perft(fen, 2, workers=2, hash_mb=1) == expected[1]
+        assert list(parallel_divide(Board(fen), 2, workers=2).items()) == list(divide(Board(fen), 2).items())
+        assert parallel_perft(fen, 0) == 1 and parallel_perft(fen, 1) == expected[0]
+
+        # results keep the input order, no matter how the chunks are spread
+        lines = ['# comment', ''] + [fen for _, fen, _ in PERFT_POSITIONS] * 3
+        fens = analyze(lines, Board.to_fen, workers=2, chunk_size=4)
+        assert fens == [Board(fen).to_fen() for _, fen, _ in PERFT_POSITIONS] * 3
+
+        # lines are only read as far as the chunks in flight need, two per worker
+        read = []
+
+        def lines_read():
+            for line in lines * 20:
+                read.append(line)
+                yield line
+
+        results = analyze_iter(lines_read(), Board.to_fen, workers=1, chunk_size=4)
+        assert next(results) == fens[0] and len(read) <= 3 * 4 + 1
+        assert len(list(results)) == len(fens) * 20 - 1
+
+
+class TestEvaluation(BaseTest):
+    def __init__(self):
+        super(TestEvaluation, self).__init__(name="Test incremental evaluation")
+
+    def run(self):
+        import random
+        from chess import Board, PERFT_POSITIONS
+
+        assert Board().evaluate() == 0
+        # mirrored positions get the same score for the side to move
+        assert (Board("4k3/8/8/8/8/8/4P3/4K3 w - - 0 1").evaluate() ==
+                Board("4k3/4p3/8/8/8/8/8/4K3 b - - 0 1").evaluate() > 0)
+        assert Board("4k3/8/8/8/8/8/8/4K2R b K - 0 1").evaluate() < 0
+
+        rng = random.Random(7)
+        for _, fen, _ in PERFT_POSITIONS:
+            board = Board(fen)
+            start = board.evaluate()
+            for _ in range(60):
+                moves = list(board.gen_legal_moves())
+                if not moves:
+                    break
+                board.push(rng.choice(moves))
+                assert board.evaluate() == board.evaluate(full=True) == Board(board.to_fen()).evaluate()
+            while board.move_stack:
+                board.pop()
+            assert board.evaluate() == start
+            assert (board.mg_score, board.eg_score, board.phase) == board._evaluation_from_scratch()
+
+
+class TestSearch(BaseTest):
+    def __init__(self):
+        super(TestSearch, self).__init__(name="Test alpha-beta search")
+
+    def run(self):
+        from chess import Board, Move, BASEBOARD, PERFT_POSITIONS, QUEEN
+        from search import Search, MATE
+
+        search = Search()
+        move, info = search.search(Board("6k1/5ppp/8/8/8/8/8/R5K1 w - - 0 1"), depth=3)
+        assert move.uci == "a1a8" and info.score == MATE - 1
+
+        # mate in two: Nf6+ gxf6 Bxf7#
+        board = Board("r2qkb1r/pp2nppp/3p4/2pNN1B1/2BnP3/3P4/PPP2PPP/R2bK2R w KQkq - 1 1")
+        infos = []
+        move, info = search.search(board, depth=5, info=infos.append)
+        assert move.uci == "d5f6" and info.score == MATE - 3
+        assert [m.uci for m in info.pv] == ["d5f6", "g7f6", "c4f7"]
+        assert [i.depth for i in infos] == list(range(1, info.depth + 1))
+        assert board.to_fen() == "r2qkb1r/pp2nppp/3p4/2pNN1B1/2BnP3/3P4/PPP2PPP/R2bK2R w KQkq - 1 1"
+
+        # limits
+        board = Board()
+        move, info = search.search(board, nodes=2000)
+        assert move is not None and search.nodes <= 2000
+        assert not board.move_stack and board.to_fen() == BASEBOARD
+        move, info = search.search(Board(), movetime=0.2)
+        assert move is not None and info.time < 1
+
+        # no legal moves
+        assert search.search(Board("7k/5Q2/6K1/8/8/8/8/8 b - - 0 1"))[0] is None
+        assert search.search(Board("7k/6Q1/6K1/8/8/8/8/8 b - - 0 1"))[1].score == -MATE
+
+        # the staged picker yields every legal move once, hash move first and captures before quiet moves
+        for name, fen, _ in PERFT_POSITIONS:
+            board = Board(fen)
+            legal = list(board.gen_legal_moves())
+            quiet = [m for m in legal if board.squares[m.to_square] is None and not m >> 12]
+            search.killers[1] = [int(quiet[-1]), int(Move.from_uci("a1a2"))]
+            for hash_move in (None, legal[0], legal[-1], Move.from_uci("h8h1")):
+                picked = list(search._moves(board, hash_move, 1))
+                assert sorted(picked) == sorted(legal), name
+                if hash_move in legal:
+                    assert picked[0] == hash_move
+                if quiet[-1] != hash_move:
+                    assert picked.index(quiet[-1]) == min(picked.index(m) for m in quiet if m != hash_move)
+            # the quiescence search only gets captures that do not lose material and queen promotions
+            noisy = list(search._moves(board, None, 1, quiets=False))
+            assert sorted(noisy) == sorted(m for m in legal if m not in quiet and
+                                           (m >> 12 == QUEEN or not m >> 12 and board.see(m) >= 0)), name
+        board = Board("4k3/8/8/3p4/4q3/3P4/8/4K2R w K - 0 1")
+        assert [m.uci for m in search._moves(board, None, 2, quiets=False)] == ["d3e4"]
+        board = Board("4k3/8/2p5/3p4/8/8/8/3QK3 w - - 0 1")
+        assert list(search._moves(board, None, 2, quiets=False)) == []
+        board = Board("4k3/8/2p5/3p4/8/8/8/3QK3 w - - 0 1")
+        assert [m.uci for m in search._moves(board, None, 2)][-1] == "d1d5"
+
+
+class TestUCI(BaseTest):
+    def __init__(self):
+        super(TestUCI, self).__init__(name="Test UCI engine")
+
+    def run(self):
+        import io
+        from search import MATE
+        from uci import UCIEngine, DEFAULT_MOVETIME, time_budget, format_score
+
+        output = io.StringIO()
+        engine = UCIEngine(output, hash_mb=1)
+        engine.run(["uci", "isready", "position startpos moves e2e4 e7e5 g1f3", "go depth 2",
+                    "position fen 6k1/5ppp/8/8/8/8/8/R5K1 w - - 0 1", "go depth 3", "isready", "quit",
+                    "go depth 1"])
+        lines = output.getvalue().splitlines()
+        assert lines[3:5] == ["uciok", "readyok"]
+        assert engine.board.to_fen() == "6k1/5ppp/8/8/8/8/8/R5K1 w - - 0 1"
+        assert [line for line in lines if line.startswith("bestmove")][-1] == "bestmove a1a8"
+        assert len([line for line in lines if line.startswith("bestmove")]) == 2
+        assert any("score mate 1" in line for line in lines)
+
+        # the search runs in the background until stop
+        engine.handle("go infinite")
+        assert engine.thread.is_alive()
+        engine.handle("stop")
+        assert engine.thread is None and output.getvalue().splitlines()[-1] == "bestmove a1a8"
+
+        engine.handle("position startpos moves e2e5")
+        assert "invalid position" in output.getvalue().splitlines()[-1]
+
+        # malformed numbers are reported and skipped, the engine keeps running
+        search = engine.search
+        assert engine.handle("setoption name Hash value big")
+        assert engine.search is search and "invalid value for Hash" in output.getvalue().splitlines()[-1]
+        assert engine.handle("position fen 6k1/5ppp/8/8/8/8/8/R5K1 w - - 0 1") and engine.handle("go depth x nodes 500")
+        engine.stop()
+        lines = output.getvalue().splitlines()
+        assert "info string invalid value for depth: x" in lines and lines[-1] == "bestmove a1a8"
+
+        # only the opponent's clock: the default budget applies instead of searching to MAX_PLY
+        limits = []
+        engine.search.search = lambda board, info, **kwargs: limits.append(kwargs) or (None, None)
+        engine.handle("go btime 1000")
+        engine.stop()
+        assert limits[-1]["movetime"] == DEFAULT_MOVETIME and output.getvalue().splitlines()[-1] == "bestmove 0000"
+
+        # a failing search is reported and still ends with bestmove
+        def fail(board, info, **kwargs):
+            raise RuntimeError("boom")
+
+        engine.search.search = fail
+        engine.handle("go depth 2")
+        engine.stop()
+        lines = output.getvalue().splitlines()
+        assert lines[-2] == "info string search failed: RuntimeError('boom')" and lines[-1] == "bestmove 0000"
+
+        assert format_score(42) == "cp 42" and format_score(MATE - 3) == "mate 2"
+        assert format_score(-MATE + 2) == "mate -1"
+        assert 0 < time_budget(60, 1) < 4 and time_budget(0.1) <= 0.05 and time_budget(10, 0, 1) < 10
+
+
+class TestSAN(BaseTest):
+    def __init__(self):
+        super(TestSAN, self).__init__(name="Test SAN parsing and writing")
+
+    def run(self):
+        from chess import Board, Move, PERFT_POSITIONS
+
+        b = Board()
+        assert b.parse_san("e4") == Move.from_uci("e2e4") and b.parse_san("Nf3") == Move.from_uci("g1f3")
+        assert b.san(Move.from_uci("b1c3")) == "Nc3"
+
+        # kiwipete: castling and captures
+        b = Board("r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1")
+        assert b.parse_san("O-O") == Move.from_uci("e1g1") and b.san(Move.from_uci("e1c1")) == "O-O-O"
+        assert b.parse_san("Nxf7") == Move.from_uci("e5f7") and b.san(Move.from_uci("d5e6")) == "dxe6"
+
+        # disambiguation by file, by rank and by both
+        b = Board("4k3/8/8/1N6/8/5N2/8/1N1NK3 w - - 0 1")
+        assert b.san(Move.from_uci("d1c3")) == "Ndc3" and b.parse_san("Ndc3") == Move.from_uci("d1c3")
+        assert b.san(Move.from_uci("b5c3")) == "N5c3" and b.parse_san("Nb1c3") == Move.from_uci("b1c3")
+        assert b.san(Move.from_uci("b1c3")) == "Nb1c3" and b.parse_san("Nfd2") == Move.from_uci("f3d2")
+
+        # promotion, ep and check marks
+        b = Board("4k3/1P6/8/3pP3/8/8/8/4K3 w - d6 0 1")
+        assert b.parse_san("b8=Q+") == Move.from_uci("b7b8q") and b.san(Move.from_uci("b7b8r")) == "b8=R+"
+        assert b.parse_san("exd6") == Move.from_uci("e5d6") and b.san(Move.from_uci("e5d6")) == "exd6"
+        assert Board("6k1/5ppp/8/8/8/8/8/R5K1 w - - 0 1").san(Move.from_uci("a1a8")) == "Ra8#"
+
+        # a pinned knight needs no disambiguation
+        b = Board("4k3/8/8/8/4r3/8/4N3/1N2K3 w - - 0 1")
+        assert b.san(Move.from_uci("b1d2")) == "Nd2" and b.parse_san("Nd2") == Move.from_uci("b1d2")
+
+        for san in ("Ke2", "Nd4", "e5", "O-O", "Qxe4", "Nc3d2", "b8=Q"):
+            try:
+                b.parse_san(san)
+                assert False, san
+            except ValueError:
+                pass
+
+        # every legal move survives a round trip
+        for _, fen, _ in PERFT_POSITIONS:
+            b = Board(fen)
+            for move in b.gen_legal_moves():
+                assert b.parse_san(b.san(move)) == move
+
+
+class TestPGN(BaseTest):
+    def __init__(self):
+        super(TestPGN, self).__init__(name="Test streaming PGN reader and writer")
+
+    def run(self):
+        import gzip
+        import io
+        import os
+        import tempfile
+        from pgn import Game, read_games, write_games
+        from chess import Board
+
+        text = '''[Event "Test"]
+[White "A \\"B\\""]
+[Result "1-0"]
+
+1.e4 e5 2. Nf3 {a comment
+over two lines} Nc6 (2... d6 3. d4) 3.Bb5 $1 a6 ; rest of line
+4. Ba4 Nf6 5. O-O Be7 1-0
+
+[Event "Second"]
+[FEN "6k1/5ppp/8/8/8/8/8/R5K1 b - - 0 30"]
+
+30... h6 31. Ra8+ Kh7 *
+'''
+        games = list(read_games(io.StringIO(text)))
+        assert len(games) == 2 and games[0].headers['White'] == 'A "B"' and games[0].result == '1-0'
+        assert [m.uci for m in games[0].moves[:4]] == ["e2e4", "e7e5", "g1f3", "b8c6"] and len(games[0].moves) == 10
+        assert games[1].board() == Board("R7/5ppk/7p/8/8/8/8/6K1 w - - 0 32")
+        assert [len(g.headers) for g in read_games(io.StringIO(text), moves=False)] == [7, 8]
+
+        pgn = games[1].to_pgn()
+        assert pgn.endswith('\n\n30... h6 31. Ra8+ Kh7 *\n')
+        assert '[White "A \\"B\\""]' in games[0].to_pgn()
+
+        # gzip round trip
+        path = os.path.join(tempfile.mkdtemp(), "games.pgn.gz")
+        assert write_games(games * 2, path) == 4
+        again = list(read_games(path))
+        assert [g.moves for g in again] == [g.moves for g in games] * 2
+        assert [dict(g.headers) for g in again] == [dict(g.headers) for g in games] * 2
+
+        board = Board()
+        for san in ("f3", "e5", "g4", "Qh4#"):
+            board.push(board.parse_san(san))
+        assert Game.from_board(board, {'Result': '0-1'}).to_pgn().endswith("1. f3 e5 2. g4 Qh4# 0-1\n")
+
+        try:
+            list(read_games(io.StringIO("1. e4 e5 2. Ke3 *")))
+            assert False
+        except ValueError:
+            pass
+        assert list(read_games(io.StringIO("1. e4 e5 2. Ke3 *"), skip_errors=True)) == []
+
+        # a wrapped comment whose next line starts with a bracket does not start a new game
+        text = '[Event "Clock"]\n\n1. e4 { White thinks\n[%clk 0:03:00] } e5 *\n\n[Event "Next"]\n\n1. d4 *\n'
+        games = list(read_games(io.StringIO(text)))
+        assert [[m.uci for m in g.moves] for g in games] == [["e2e4", "e7e5"], ["d2d4"]]
+        assert [g.headers['Event'] for g in games] == ["Clock", "Next"]
+
+        # a game with tags but no movetext is kept and keeps its own tags
+        text = '[Event "A"]\n[Result "*"]\n\n[Event "B"]\n\n1. e4 e5 1-0\n'
+        path = os.path.join(tempfile.mkdtemp(), "headers.pgn.gz")
+        with gzip.open(path, 'wt') as f:
+            f.write(text)
+        for source in (io.StringIO(text), path):
+            games = list(read_games(source))
+            assert [(g.headers['Event'], g.result) for g in games] == [("A", "*"), ("B", "1-0")]
+            assert [len(g.moves) for g in games] == [0, 2]
+        games = list(read_games(io.StringIO('1. e4 {a} {b\n[c} e5 ; {\n[Event "Next"]\n1. d4 *\n')))
+        assert [len(g.moves) for g in games] == [2, 1]
+
+
+class TestPolyglotBook(BaseTest):
+    def __init__(self):
+        super(TestPolyglotBook, self).__init__(name="Test memory-mapped Polyglot book")
+
+    def run(self):
+        import os
+        import pickle
+        import random
+        import tempfile
+        from book import PolyglotBook, load_randoms, polyglot_key, write_book, encode_move, decode_move
+        from chess import Board, Move
+
+        # reference keys from the Polyglot book format specification
+        for moves, key in (("", 0x463B96181691FC9C),
+                           ("e2e4", 0x823C9B50FD114196),
+                           ("e2e4 d7d5", 0x0756B94461C50FB0),
+                           ("e2e4 d7d5 e4e5", 0x662FAFB965DB29D4),
+                           ("e2e4 d7d5 e4e5 f7f5", 0x22A48B5A8E47FF78),
+                           ("e2e4 d7d5 e4e5 f7f5 e1e2", 0x652A607CA3F242C1),
+                           ("e2e4 d7d5 e4e5 f7f5 e1e2 e8f7", 0x00FDD303C946BDD9),
+                           ("a2a4 b7b5 h2h4 b5b4 c2c4", 0x3C8123EA7B067637),
+                           ("a2a4 b7b5 h2h4 b5b4 c2c4 b4c3 a1a3", 0x5C3F9B829B279560)):
+            board = Board()
+            for uci in moves.split():
+                board.make_move(Move.from_uci(uci))
+            assert polyglot_key(board) == key, moves
+
+        # a custom table read from a random.c style file
+        rng = random.Random(781)
+        directory = tempfile.mkdtemp()
+        random_path = os.path.join(directory, "random.c")
+        with open(random_path, "w") as f:
+            f.write(",\n".join("U64(0x{:016X})".format(rng.getrandbits(64)) for _ in range(781)))
+        randoms = load_randoms(random_path)
+
+        start, e4 = Board(), Board("rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq e3 0 1")
+        castle = Board("r3k2r/8/8/8/8/8/8/R3K2R w KQkq - 0 1")
+        # the ep square only counts if it can be captured
+        no_ep = Board("rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq - 0 1")
+        assert polyglot_key(e4, randoms) == polyglot_key(no_ep, randoms) != polyglot_key(start, randoms)
+        for move in ("e1g1", "e1c1", "a1a8"):
+            assert decode_move(castle, encode_move(castle, Move.from_uci(move))) == Move.from_uci(move)
+        assert encode_move(castle, Move.from_uci("e1g1")) == 4 << 6 | 7
+
+        path = os.path.join(directory, "book.bin")
+        write_book(path, [(start, Move.from_uci("e2e4"), 60), (start, Move.from_uci("d2d4"), 30),
+                          (start, Move.from_uci("g1f3"), 10), (e4, Move.from_uci("c7c5"), 5),
+                          (castle, Move.from_uci("e1c1"), 1), (start, Move.from_uci("e2e5"), 99)], randoms)
+        with PolyglotBook(path, randoms) as book:
+            assert len(book) == 6
+            assert [(e.move.uci, e.weight) for e in book.find_all(start)] == [("e2e4", 60), ("d2d4", 30),
+                                                                               ("g1f3", 10)]
+            assert book.best(e4).uci == "c7c5" and book.best(castle).uci == "e1c1"
+            assert book.find_all(Board("8/8/8/8/8/8/8/K6k w - - 0 1")) == [] and book.choice(castle.copy()) is not None
+            picks = [book.choice(start, random.Random(i)).uci for i in range(300)]
+            assert picks.count("e2e4") > picks.count("d2d4") > picks.count("g1f3") > 0
+
+            many = book.find_all_many([e4, start, Board("8/8/8/8/8/8/8/K6k w - - 0 1"), start])
+            assert [len(entries) for entries in many] == [1, 3, 0, 3]
+            assert many[1] == book.find_all(start)
+
+            again = pickle.loads(pickle.dumps(book))
+            assert again.best(start).uci == "e2e4"
+            again.close()
+
+
+class TestRepetition(BaseTest):
+    def __init__(self):
+        super(TestRepetition, self).__init__(name="Test repetition and fifty-move detection")
+
+    def run(self):
+        from chess import Board, Move
+        from search import Search
+
+        b = Board()
+        shuffle = [Move.from_uci(uci) for uci in ("g1f3", "g8f6", "f3g1", "f6g8")]
+        for move in shuffle:
+            assert not b.is_repetition(2)
+            b.make_move(move)
+        assert b.is_repetition(2) and not b.is_repetition()
+        for move in shuffle:
+            b.make_move(move)
+        assert b.is_repetition() and not b.is_repetition(4)
+        b.pop()
+        assert b.is_repetition(2) and not b.is_repetition()
+
+        # a pawn move can not be taken back, earlier positions are not looked at
+        b = Board()
+        for uci in ("g1f3", "g8f6", "f3g1", "f6g8", "e2e3"):
+            b.make_move(Move.from_uci(uci))
+        assert b.half_move_clock == 0
+        for uci in ("g8f6", "g1f3", "f6g8", "f3g1"):
+            b.make_move(Move.from_uci(uci))
+        assert b.is_repetition(2) and not b.is_repetition()
+
+        # the ep square of a double push only counts if a pawn can capture there
+        b = Board()
+        for uci in ("e2e4", "b8c6", "g1f3", "c6b8", "f3g1", "b8c6", "g1f3", "c6b8", "f3g1"):
+            b.make_move(Move.from_uci(uci))
+        assert b.is_repetition() and b.outcome(claim_draw=True) is not None
+        assert b.zobrist == b._zobrist_from_scratch() == Board(b.to_fen()).zobrist
+        b = Board("4k3/3p4/8/4P3/8/8/8/4K3 b - - 0 1")
+        b.push(Move.from_uci("d7d5"))
+        assert b.zobrist != Board("4k3/8/8/3pP3/8/8/8/4K3 w - - 0 2").zobrist
+        assert b.zobrist == Board(b.to_fen()).zobrist == b._zobrist_from_scratch()
+
+        b = Board("4k3/8/8/8/8/8/4P3/4K2Q w - - 98 80")
+        assert not b.is_fifty_moves()
+        b.make_move(Move.from_uci("h1h2"))
+        b.make_move(Move.from_uci("e8d7"))
+        assert b.is_fifty_moves()
+        b.pop()
+        b.pop()
+        b.make_move(Move.from_uci("e2e4"))
+        assert b.half_move_clock == 0 and not b.is_fifty_moves()
+
+        # a queen up, but every move except the pawn moves ends the game
+        b = Board("4k3/8/8/8/8/8/4P3/4K2Q w - - 99 80")
+        move, info = Search().search(b, depth=3)
+        assert b.squares[move & 0x3f] % 6 == 5 and info.score > 500
+        b = Board("4k3/8/8/8/8/8/8/4K2Q w - - 99 80")
+        move, info = Search().search(b, depth=3)
+        assert info.score == 0
+
+
+class TestEndgameTables(BaseTest):
+    def __init__(self):
+        super(TestEndgameTables, self).__init__(name="Test retrograde endgame tables")
+
+    def run(self):
+        import os
+        import tempfile
+        from chess import Board
+        from endgame import EndgameTables, EndgameProbe, generate, write
+        from search import Search, MATE
+
+        # KPK needs KQK and KRK for its promotions, KBNK takes too long for the test suite
+        tables = generate(['KPK'])
+        assert list(tables) == ['KQK', 'KRK', 'KPK']
+        # the longest wins with white to move (odd plies) match the known distances to mate
+        assert [max(v for v in tables[name][:len(tables[name]) // 2]) - 1 for name in tables] == [19, 31, 55]
+
+        path = os.path.join(tempfile.mkdtemp(), "tables.egtb")
+        write(path, tables)
+        with EndgameTables(path) as tb:
+            assert tb.max_pieces == 3
+            assert tb.probe(Board("7k/8/6K1/8/8/8/8/1Q6 w - - 0 1")) == EndgameProbe(1, 1)
+            assert tb.probe(Board("7k/6Q1/6K1/8/8/8/8/8 b - - 0 1")) == EndgameProbe(-1, 0)
+            # black as the strong side is mirrored
+            assert tb.probe(Board("1q6/8/8/8/8/6k1/8/7K b - - 0 1")) == EndgameProbe(1, 1)
+            # stalemate and the opposition
+            assert tb.probe(Board("k7/2Q5/1K6/8/8/8/8/8 b - - 0 1")) == EndgameProbe(0, None)
+            assert tb.probe(Board("4k3/8/4K3/4P3/8/8/8/8 b - - 0 1")).wdl == -1
+            assert tb.probe(Board("4k3/8/8/4K3/4P3/8/8/8 w - - 0 1")).wdl == 1
+            assert tb.probe(Board("4k3/8/8/4K3/4P3/8/8/8 b - - 0 1")) == EndgameProbe(0, None)
+            # a rook pawn does not win against a king in the corner
+            assert tb.probe(Board("k7/8/1K6/P7/8/8/8/8 w - - 0 1")) == EndgameProbe(0, None)
+            # positions without a table or with castling rights are not covered
+            assert tb.probe(Board("8/8/8/8/8/8/8/K6k w - - 0 1")) is None
+            assert tb.probe(Board("8/8/8/4k3/8/8/8/R3K3 w Q - 0 1")) is None
+            assert tb.probe(Board()) is None
+
+            board = Board("8/8/8/4k3/8/8/8/R3K3 w - - 0 1")
+            dtm = tb.probe(board).dtm
+            move, info = Search(tablebases=tb).search(board, depth=3)
+            assert info.score == MATE - dtm
+            board.push(move)
+            assert tb.probe(board) == EndgameProbe(-1, dtm - 1)
+
+
+class TestCaptures(BaseTest):
+    def __init__(self):
+        super(TestCaptures, self).__init__(name="Test capture generation and static exchange evaluation")
+
+    def run(self):
+        import random
+        from chess import Board, Move, PERFT_POSITIONS, PAWN
+
+        def is_capture(board, move):
+            return (board.squares[move.to_square] is not None or
+                    move.to_square == board.ep_square and board.squares[move.from_square] % 6 == PAWN)
+
+        rnd = random.Random(25)
+        fens = [fen for _, fen, _ in PERFT_POSITIONS] + ["4k3/8/8/3pP3/8/8/8/4K3 w - d6 0 1",
+                                                         "1n2k3/P7/8/8/8/8/8/4K3 w - - 0 1"]
+        for fen in fens:
+            b = Board(fen)
+            for _ in range(30):
+                legal = list(b.gen_legal_moves())
+                if not legal:
+                    break
+                assert sorted(b.gen_captures()) == sorted(m for m in legal if is_capture(b, m)), b.to_fen()
+                assert sorted(b.gen_promotions()) == sorted(m for m in legal if m >> 12 and not is_capture(b, m))
+                b.push(rnd.choice(legal))
+
+        for fen, uci, value in (("1k1r4/1pp4p/p7/4p3/8/P5P1/1PP4P/2K1R3 w - - 0 1", "e1e5", 100),
+                                ("1k1r3q/1ppn3p/p4b2/4p3/8/P2N2P1/1PP1R1BP/2K1Q3 w - - 0 1", "d3e5", -220),
+                                ("4k3/8/2p5/3p4/8/8/8/3QK3 w - - 0 1", "d1d5", -800),
+                                # the rook behind the queen joins the exchange
+                                ("4k3/8/2p5/3p4/8/8/3R4/3QK3 w - - 0 1", "d2d5", -300),
+                                ("3rk3/3r4/8/3p4/8/8/3R4/3QK3 w - - 0 1", "d2d5", -400),
+                                ("3rk3/8/8/3p4/8/8/3R4/3QK3 w - - 0 1", "d2d5", 100),
+                                ("4k3/8/8/3pP3/8/8/8/4K3 w - d6 0 1", "e5d6", 100),
+                                ("1n2k3/P7/8/8/8/8/8/4K3 w - - 0 1", "a7b8q", 1120),
+                                # the king may only recapture on an undefended square
+                                ("4k3/8/8/3r4/4K3/8/8/3R4 b - - 0 1", "d5d1", 500),
+                                ("4k3/8/8/3r4/8/8/4K3/3R4 b - - 0 1", "d5d1", 0),
+                                ("3qk3/8/8/3r4/8/8/4K3/3R4 b - - 0 1", "d5d1", 500),
+                                ("4k3/8/8/3r4/8/8/4K3/3R4 w - - 0 1", "e2e3", 0)):
+            assert Board(fen).see(Move.from_uci(uci)) == value, (fen, uci)
+
+
 class TestCheckmate(BaseTest):
     def __init__(self):
         super(TestCheckmate, self).__init__(name="Test if checkmate detection works")
 
     def run(self):
-        from chess import Board, Move
+        from chess import (Board, Move, Outcome, BLACK, CHECKMATE, STALEMATE, INSUFFICIENT_MATERIAL, FIFTY_MOVES,
+                           THREEFOLD_REPETITION)
 
         b = Board("rnbqkbnr/ppp1pppp/8/1B1p4/4P3/8/PPPP1PPP/RNBQK1NR b KQkq - 1 2")
-        assert b.stalemate()
-        assert not b.checkmate()
+        assert b.is_check()
+        assert not b.is_checkmate() and not b.is_stalemate()
+        assert b.outcome() is None
 
         b = Board("rnb1kbnr/pppp1ppp/4p3/8/6Pq/5P2/PPPPP2P/RNBQKBNR w KQkq - 1 3")
-        assert b.stalemate()
-        assert b.checkmate()
+        assert b.is_check()
+        assert b.checkmate() and b.is_checkmate() and not b.is_stalemate()
+        assert b.outcome() == Outcome(CHECKMATE, BLACK, '0-1')
+
+        # the king can not step back along the checking rank, but off it
+        b = Board("4k3/8/8/8/8/8/8/r3K3 w - - 0 1")
+        assert b.is_check() and not b.is_checkmate()
+        assert Move.from_uci("e1f1") not in b.gen_legal_moves()
+        b = Board("4k3/8/8/8/8/8/4q3/4K3 w - - 0 1")
+        assert not b.is_checkmate()
+        b = Board("4k3/8/8/8/8/3b4/4q3/4K3 w - - 0 1")
+        assert b.is_checkmate()
+
+        b = Board("7k/5Q2/6K1/8/8/8/8/8 b - - 0 1")
+        assert not b.is_check() and b.is_stalemate() and not b.is_checkmate()
+        assert b.outcome() == Outcome(STALEMATE, None, '1/2-1/2')
+        assert not Board().is_check() and not Board().is_stalemate() and Board().outcome() is None
+
+        for fen, insufficient in (("8/8/8/4k3/8/8/8/4K3 w - - 0 1", True),
+                                  ("8/8/8/4k3/8/8/8/4KN2 w - - 0 1", True),
+                                  ("8/8/8/4k3/8/8/8/4KB2 w - - 0 1", True),
+                                  ("8/8/2b5/4k3/8/8/8/4KB2 w - - 0 1", True),
+                                  ("8/8/3b4/4k3/8/8/8/4KB2 w - - 0 1", False),
+                                  ("8/8/8/4k3/8/8/8/3NKB2 w - - 0 1", False),
+                                  ("8/8/8/4k3/8/8/8/3NKN2 w - - 0 1", False),
+                                  ("8/8/8/4k3/8/8/4P3/4K3 w - - 0 1", False),
+                                  ("8/8/8/4k3/8/8/8/4KR2 w - - 0 1", False)):
+            assert Board(fen).is_insufficient_material() == insufficient, fen
+        assert Board("8/8/8/4k3/8/8/8/4KN2 w - - 0 1").outcome().termination == INSUFFICIENT_MATERIAL
+
+        # fifty moves and repetitions only end the game when claimed
+        b = Board("4k3/8/8/8/8/8/8/4K2R w - - 100 80")
+        assert b.outcome() is None
+        assert b.outcome(claim_draw=True) == Outcome(FIFTY_MOVES, None, '1/2-1/2')
+        b = Board("4k3/8/8/8/8/8/8/4K2R w - - 0 1")
+        for _ in range(2):
+            for uci in ("h1h2", "e8d8", "h2h1", "d8e8"):
+                b.make_move(Move.from_uci(uci))
+        assert b.outcome() is None
+        assert b.outcome(claim_draw=True).termination == THREEFOLD_REPETITION
+
+
+class TestMoveEncoding(BaseTest):
+    def __init__(self):
+        super(TestMoveEncoding, self).__init__(name="Test 16 bit move encoding")
+
+    def run(self):
+        import pickle
+        from array import array
+        from chess import Board, Move, SQ_NUM, QUEEN, KNIGHT
+
+        m = Move.from_uci("e7e8n")
+        assert (m.from_square, m.to_square, m.promotion) == (SQ_NUM['e7'], SQ_NUM['e8'], KNIGHT)
+        assert m.uci == "e7e8n" and repr(m) == "e7e8n"
+        assert m == SQ_NUM['e7'] | SQ_NUM['e8'] << 6 | KNIGHT << 12
+        assert m < 1 << 16
+        assert Move.from_uci("E7E8Q") == Move(SQ_NUM['e7'], SQ_NUM['e8'], QUEEN)
+        assert Move.from_uci("e2e4").promotion == 0
+        assert pickle.loads(pickle.dumps(m)) == m and type(pickle.loads(pickle.dumps(m))) is Move
+
+        for bad in ("e2", "e2e9", "e7e8k", "e7e8qq", "i2i4"):
+            try:
+                Move.from_uci(bad)
+                assert False, bad
+            except ValueError:
+                pass
+
+        moves = array('H', Board().gen_legal_moves())
+        assert len(moves) == 20
+        assert Move.from_code(moves[0]) in Board().gen_legal_moves()
+
+
+class TestPushPop(BaseTest):
+    def __init__(self):
+        super(TestPushPop, self).__init__(name="Test push and pop")
+
+    def run(self):
+        from chess import Board, Move
+
+        for fen in ("rnbqkbnr/ppp1p1pp/8/3pPp2/8/8/PPPP1PPP/RNBQKBNR w KQkq f6 0 3",
+                    "rnbqk2r/ppp3pp/3bpP1n/3p4/8/BP3Q2/P1PP1PPP/RN2KBNR b KQkq - 2 6",
+                    "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1"):
+            b = Board(fen)
+            for m in list(b.gen_pseudo_legal_moves()):
+                b.push(m)
+                b.pop()
+                assert b.to_fen() == fen
+                assert b.occupied == Board(fen).occupied
+
+        b = Board("r3k2r/1P6/8/8/8/8/8/R3K2R w KQkq - 0 1")
+        b.push(Move.from_uci("b7b8q"))
+        assert b.to_fen() == "rQ2k2r/8/8/8/8/8/8/R3K2R b KQkq - 0 1"
+        b.push(Move.from_uci("e8g8"))
+        assert b.to_fen() == "rQ3rk1/8/8/8/8/8/8/R3K2R w KQ - 1 2"
+        b.push(Move.from_uci("a1a8"))
+        assert b.to_fen() == "RQ3rk1/8/8/8/8/8/8/4K2R b K - 0 2"
+        assert b.pop() == Move.from_uci("a1a8")
+        b.pop()
+        b.pop()
+        assert b.to_fen() == "r3k2r/1P6/8/8/8/8/8/R3K2R w KQkq - 0 1"
+
+        # capturing a rook on its corner ends the castling right
+        b.push(Move.from_uci("h1h8"))
+        assert b.to_fen() == "r3k2R/1P6/8/8/8/8/8/R3K3 b Qq - 0 1"
+        b.pop()
+        assert not b.move_stack
+
+
+class TestAttackCache(BaseTest):
+    def __init__(self):
+        super(TestAttackCache, self).__init__(name="Test cached attack maps")
+
+    def run(self):
+        import random
+        from chess import Board, PERFT_POSITIONS, _lsb
+
+        rnd = random.Random(23)
+        for name, fen, _ in PERFT_POSITIONS:
+            b = Board(fen)
+            for _ in range(40):
+                moves = list(b.gen_legal_moves())
+                if not moves:
+                    break
+                # every cached map equals a fresh computation with the explicit occupancy
+                assert b.attack_cache is not None
+                for color in (0, 1):
+                    assert b.attacked_fields(color) == b.attacked_fields(color, b.occupied), name
+                    assert b.attacked_fields(color) is b.attack_cache[color]
+                    king = b.pieces[color * 6]
+                    assert b.attackers(not color, _lsb(king)) == b.attackers(not color, _lsb(king), b.occupied)
+                cache = b.attack_cache
+                b.push(rnd.choice(moves))
+                assert b.attack_cache is None
+                assert b.is_check(not b.active_player) is False and b.attack_cache is not None
+                b.pop()
+                # take back restores the maps of the position
+                assert b.attack_cache is cache
+                b.push(rnd.choice(moves))
+            assert b.copy().attack_cache is None
+
+
+class TestZobrist(BaseTest):
+    def __init__(self):
+        super(TestZobrist, self).__init__(name="Test incremental zobrist hashing")
+
+    def run(self):
+        from chess import Board, Move
+
+        b = Board("r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1")
+        start = b.zobrist
+        for m in list(b.gen_pseudo_legal_moves()):
+            b.push(m)
+            assert b.zobrist == b._zobrist_from_scratch()
+            for n in list(b.gen_pseudo_legal_moves()):
+                b.push(n)
+                assert b.zobrist == b._zobrist_from_scratch()
+                b.pop()
+            b.pop()
+            assert b.zobrist == start
+
+        # transpositions hash alike, clocks are not part of the key
+        b = Board()
+        for uci in ("g1f3", "g8f6", "f3g1", "f6g8"):
+            b.make_move(Move.from_uci(uci))
+        assert b == Board() and hash(b) == hash(Board())
+        b.make_move(Move.from_uci("e2e4"))
+        # no black pawn can capture on e3, so the ep square is not part of the key
+        assert b == Board("rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq - 0 1")
+        assert len({Board(), Board(), b}) == 2
+
+
+class TestTranspositionTable(BaseTest):
+    def __init__(self):
+        super(TestTranspositionTable, self).__init__(name="Test transposition table")
+
+    def run(self):
+        from chess import TranspositionTable, Move, EXACT, LOWER_BOUND, UPPER_BOUND
+
+        tt = TranspositionTable(1)
+        assert len(tt) * TranspositionTable.ENTRY_SIZE == 1024 * 1024
+        assert tt.probe(42) is None
+
+        tt.store(42, 5, EXACT, -120, Move.from_uci("a7a8q"))
+        assert tt.probe(42) == (5, EXACT, -120, Move.from_uci("a7a8q"))
+
+        # a shallower result of a colliding position goes to the always-replace slot
+        collision = 42 + (tt.mask + 1)
+        tt.store(collision, 2, LOWER_BOUND, 30)
+        assert tt.probe(42) == (5, EXACT, -120, Move.from_uci("a7a8q"))
+        assert tt.probe(collision) == (2, LOWER_BOUND, 30, None)
+
+        # a deeper one takes over the depth-preferred slot
+        tt.store(collision, 7, UPPER_BOUND, 10, Move.from_uci("e2e4"))
+        assert tt.probe(collision) == (7, UPPER_BOUND, 10, Move.from_uci("e2e4"))
+
+        # results of an older search are replaced regardless of depth
+        tt.new_search()
+        tt.store(42, 1, EXACT, 0)
+        assert tt.probe(42) == (1, EXACT, 0, None)
+
+        tt.clear()
+        assert tt.probe(42) is None
+
+
+class TestOccupancy(BaseTest):
+    def __init__(self):
+        super(TestOccupancy, self).__init__(name="Test incrementally updated occupancy")
+
+    def run(self):
+        from chess import Board, Move, WHITE, BLACK
+
+        def check(board):
+            white = black = 0
+            for symbol, val in board.PIECES.items():
+                if symbol.isupper():
+                    white |= val
+                else:
+                    black |= val
+            assert board.occupancy[WHITE] == white
+            assert board.occupancy[BLACK] == black
+            assert board.occupied == white | black
+
+        b = Board("rnbqkbnr/ppp1p1pp/8/3pPp2/8/8/PPPP1PPP/RNBQKBNR w KQkq f6 0 3")
+        check(b)
+        for uci in ("e5f6", "g8f6", "f1c4", "d5c4", "g1f3", "e7e6", "e1g1"):
+            b.make_move(Move.from_uci(uci))
+            check(b)
+
+
+class TestBoardRepresentation(BaseTest):
+    def __init__(self):
+        super(TestBoardRepresentation, self).__init__(name="Test piece list and mailbox")
+
+    def run(self):
+        from copy import copy
+        from chess import Board, Move, PIECE_INDEX, WHITE, BLACK, KING, PAWN, E1, E2, E4, E8
+
+        b = Board()
+        assert not hasattr(b, '__dict__')
+        assert b.pieces[WHITE * 6 + KING] == 1 << E1
+        assert b.pieces[BLACK * 6 + PAWN] == b.PIECES['p']
+        assert b.squares[E8] == PIECE_INDEX['k'] and b.squares[E4] is None
+        assert b.get_piece(E2) == 'P' and b.get_piece(E4) is None
+
+        c = copy(b)
+        c.make_move(Move.from_uci("e2e4"))
+        assert c.get_piece(E4) == 'P' and b.get_piece(E4) is None
+        assert b.to_fen() == Board().to_fen()
+        c.pop()
+        assert c == b and c.squares == b.squares
+
+        b = Board("r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1")
+        for m in list(b.gen_legal_moves()):
+            b.push(m)
+            for sq in range(64):
+                piece = b.squares[sq]
+                assert all(bool(bb >> sq & 1) == (i == piece) for i, bb in enumerate(b.pieces))
+            b.pop()
 
 
 class ShortestGame(BaseTest):
@@ -262,8 +1255,14 @@ class ShortestGame(BaseTest):
         assert (b.checkmate())
 
 
-TESTS = [LSBTest(), MSBTest(), ScanLSBFirstTest(), SetBit(), TestFENNotation(), TestKingAttacks(), TestQueenAttacks(),
-         TestBishopAttacks(), TestKnightAttacks(), TestPawnAttacks(), TestMoves(), ShortestGame(), TestCheckmate(), ]
+TESTS = [LSBTest(), MSBTest(), ScanLSBFirstTest(), SetBit(), TestAttackTables(), TestFENNotation(), TestFENCodec(),
+         TestKingAttacks(), TestQueenAttacks(), TestBishopAttacks(), TestKnightAttacks(), TestSlidingAttacks(),
+         TestPawnAttacks(), TestMoves(), TestMoveEncoding(), TestPushPop(), TestZobrist(), TestTranspositionTable(),
+         TestOccupancy(), TestBoardRepresentation(), ShortestGame(), TestPerft(), TestLegalMoves(), TestFeaturePlanes(),
+         TestBatchMoveGeneration(), TestParallel(), TestAttackCache(),
+         TestEvaluation(), TestSearch(), TestUCI(), TestSAN(),
+         TestPGN(), TestPolyglotBook(), TestEndgameTables(), TestRepetition(),
+         TestCaptures(), TestCheckmate(), ]
 
 
 def run_all_tests():
@@ -0,0 +1,201 @@
+"""
+Universal Chess Interface front end
+
+Reads UCI commands line by line and answers them. Searches run on a worker thread, so the
+command loop keeps reading while the engine thinks and answers stop, isready and quit at once.
+"""
+
+import sys
+import threading
+
+from chess import Board, Move, TranspositionTable
+from search import Search, MATE, MAX_PLY
+
+NAME = "chess"
+AUTHOR = "M0r13n"
+
+DEFAULT_HASH = 16  # MB
+MOVES_TO_GO = 30  # assumed number of moves left if the GUI does not tell
+MOVE_OVERHEAD = 0.05  # seconds kept back per move for communication
+DEFAULT_MOVETIME = 1.0  # seconds per move if go sets no limit we can use
+
+GO_PARAMETERS = ("wtime", "btime", "winc", "binc", "movestogo", "movetime", "depth", "nodes")
+
+
+def time_budget(remaining, increment=0.0, moves_to_go=None):
+    """
+    Seconds to spend on the next move.
+    :param remaining: seconds left on our clock
+    :param increment: seconds added after every move
+    :param moves_to_go: moves until the next time control, None for sudden death
+    """
+    budget = remaining / min(moves_to_go or MOVES_TO_GO, MOVES_TO_GO) + increment * 0.75
+    return max(min(budget, remaining - MOVE_OVERHEAD), 0.01)
+
+
+def format_score(score):
+    """
+    score in UCI notation, 'cp <centipawns>' or 'mate <moves>'
+    """
+    if abs(score) > MATE - MAX_PLY:
+        plies = MATE - abs(score)
+        return "mate {}".format((plies + 1) // 2 if score > 0 else -(plies // 2))
+    return "cp {}".format(score)
+
+
+class UCIEngine(object):
+    """
+    UCI protocol state: the current position, the searcher and the worker thread.
+    """
+
+    def __init__(self, output=None, hash_mb=DEFAULT_HASH):
+        self.output = sys.stdout if output is None else output
+        self.board = Board()
+        self.search = Search(TranspositionTable(hash_mb))
+        self.thread = None
+        self._lock = threading.Lock()
+        self._stop_requested = threading.Event()
+
+    def send(self, line):
+        with self._lock:
+            self.output.write(line + "\n")
+            self.output.flush()
+
+    def run(self, lines=None):
+        """
+        process commands until quit or the end of the input
+        """
+        for line in sys.stdin if lines is None else lines:
+            if not self.handle(line):
+                break
+        self.stop()
+
+    def handle(self, line):
+        """
+        Process a single command, returns False after quit.
+        Unknown commands are ignored, as the protocol asks.
+        """
+        tokens = line.split()
+        if not tokens:
+            return True
+        command, args = tokens[0], tokens[1:]
+
+        if command == "uci":
+            self.send("id name {}".format(NAME))
+            self.send("id author {}".format(AUTHOR))
+            self.send("option name Hash type spin default {} min 1 max 4096".format(DEFAULT_HASH))
+            self.send("uciok")
+        elif command == "isready":
+            self.send("readyok")
+        elif command == "ucinewgame":
+            self.stop()
+            self.search.tt.clear()
+            self.board = Board()
+        elif command == "setoption":
+            self._setoption(args)
+        elif command == "position":
+            self.stop()
+            self._position(args)
+        elif command == "go":
+            self.stop()
+            self._go(args)
+        elif command == "stop":
+            self.stop()
+        elif command == "quit":
+            return False
+        return True
+
+    def stop(self):
+        """
+        stop a running search and wait until its bestmove has been sent
+        """
+        self._stop_requested.set()
+        while self.thread is not None and self.thread.is_alive():
+            self.search.stop()
+            self.thread.join(0.01)
+        self.thread = None
+
+    def _setoption(self, args):
+        # setoption name <name> value <value>
+        if "value" not in args:
+            return
+        i = args.index("value")
+        name, value = " ".join(args[1:i]).lower(), " ".join(args[i + 1:])
+        if name == "hash":
+            try:
+                size = max(int(value), 1)
+            except ValueError:
+                self.send("info string invalid value for Hash: {}".format(value))
+                return
+            self.stop()
+            self.search = Search(TranspositionTable(size))
+
+    def _position(self, args):
+        # position [startpos | fen <fen>] moves <move1> ... <movei>
+        moves = args.index("moves") if "moves" in args else len(args)
+        try:
+            if args and args[0] == "fen":
+                board = Board(" ".join(args[1:moves]))
+            else:
+                board = Board()
+            for uci in args[moves + 1:]:
+                board.make_move(Move.from_uci(uci))
+        except ValueError as e:
+            self.send("info string invalid position: {}".format(e))
+            return
+        self.board = board
+
+    def _go(self, args):
+        params = {}
+        for i, token in enumerate(args):
+            if token in GO_PARAMETERS and i + 1 < len(args):
+                try:
+                    params[token] = int(args[i + 1])
+                except ValueError:
+                    self.send("info string invalid value for {}: {}".format(token, args[i + 1]))
+        infinite = "infinite" in args or "ponder" in args
+
+        movetime = None
+        if "movetime" in params:
+            movetime = max(params["movetime"] / 1000 - MOVE_OVERHEAD, 0.01)
+        elif not infinite:
+            white = self.board.active_player
+            remaining = params.get("wtime" if white else "btime")
+            if remaining is not None:
+                movetime = time_budget(remaining / 1000, params.get("winc" if white else "binc", 0) / 1000,
+                                       params.get("movestogo"))
+            elif "depth" not in params and "nodes" not in params:
+                # e.g. only the opponent's clock was sent, do not search until MAX_PLY
+                movetime = DEFAULT_MOVETIME
+
+        limits = dict(depth=params.get("depth", MAX_PLY), nodes=params.get("nodes"), movetime=movetime)
+        self._stop_requested.clear()
+        self.thread = threading.Thread(target=self._think, args=(self.board.copy(), limits, infinite))
+        self.thread.daemon = True
+        self.thread.start()
+
+    def _think(self, board, limits, infinite):
+        # the GUI waits for bestmove, so it is sent even if the search fails
+        move = None
+        try:
+            move, info = self.search.search(board, info=self._info, **limits)
+        except Exception as e:
+            self.send("info string search failed: {!r}".format(e))
+        finally:
+            # in infinite mode the best move may only be sent after stop
+            if infinite:
+                self._stop_requested.wait()
+            self.send("bestmove {}".format(move.uci if move is not None else "0000"))
+
+    def _info(self, info):
+        self.send("info depth {} score {} nodes {} nps {} time {} pv {}".format(
+            info.depth, format_score(info.score), info.nodes, info.nps, int(info.time * 1000),
+            " ".join(move.uci for move in info.pv)))
+
+
+def main():
+    UCIEngine().run()
+
+
+if __name__ == '__main__':
+    main()